@@ -0,0 +1,313 @@
+"""Headless batch decoder, runs the ingestion and decoding services without the web API.
+
+    uv run python api/cli.py ingest exports/ more.zip --workers 8 --resume nightly.ckpt \
+        --mappings mappings.json --decode-to decoded/
+    uv run python api/cli.py export-mappings mappings.json
+    uv run python api/cli.py decode decoded/ --svg-ids 12 13
+    uv run python api/cli.py reindex-search
+    uv run python api/cli.py compact-svg-content
+    uv run python api/cli.py gc --dry-run
+"""
+
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from database.models import init_db, SVGFile, FontFile, Glyph  # noqa: E402
+from database.database import SessionLocal, engine  # noqa: E402
+from services.svg_service import SVGService  # noqa: E402
+from services.svg_storage import svg_storage  # noqa: E402
+from services.font_service import FontService, ensure_upload_dirs  # noqa: E402
+from services.storage_gc import StorageGC  # noqa: E402
+
+logger = logging.getLogger('pdf_font_decoder.cli')
+
+
+def iter_work_units(sources: List[Path]) -> Iterator[Dict[str, Any]]:
+    """Split sources into independent units: one per ZIP and one per SVG found in a directory tree"""
+    for source in sources:
+        source = source.resolve()
+        if source.is_file() and source.suffix.lower() == '.zip':
+            yield {'key': str(source), 'kind': 'zip', 'path': str(source), 'output_dir': source.stem}
+        elif source.is_file() and source.suffix.lower() == '.svg':
+            _, _, font_files = SVGService.scan_directory(source.parent)
+            yield {
+                'key': str(source),
+                'kind': 'svg',
+                'path': str(source),
+                'fonts': [str(f) for f in font_files],
+                'output_dir': '',
+            }
+        elif source.is_dir():
+            _, svg_files, font_files = SVGService.scan_directory(source)
+            fonts = [str(f) for f in font_files]
+            for svg_file in sorted(svg_files):
+                yield {
+                    'key': str(svg_file),
+                    'kind': 'svg',
+                    'path': str(svg_file),
+                    'fonts': fonts,
+                    'output_dir': str(svg_file.parent.relative_to(source)),
+                }
+        else:
+            logger.warning(f'Skipping {source}: not a ZIP, SVG or directory')
+
+
+def load_checkpoint(path: Optional[Path]) -> set:
+    if not path or not path.exists():
+        return set()
+
+    finished = set()
+    for line in path.read_text().splitlines():
+        try:
+            finished.add(json.loads(line)['key'])
+        except (ValueError, KeyError):
+            # A run killed mid-write can leave a truncated last line
+            continue
+    return finished
+
+
+def load_mapping_set(path: Optional[Path]) -> Dict[str, Dict[str, str]]:
+    if not path:
+        return {}
+    return json.loads(path.read_text())['fonts']
+
+
+def apply_mapping_set(db, svg_file_id: int, mapping_set: Dict[str, Dict[str, str]]) -> int:
+    """Copy a mapping set onto the fonts of a freshly ingested SVG, matching fonts by name"""
+    if not mapping_set:
+        return 0
+
+    names = list(mapping_set)
+    keys = [(name, name) for name in names]
+    updated = 0
+    for font in db.query(FontFile).filter(FontFile.svg_file_id == svg_file_id).all():
+        mappings = mapping_set.get(font.font_name)
+        if mappings is None:
+            index = SVGService.match_font_for_family(font.font_name, keys)
+            mappings = mapping_set[names[index]] if index is not None else {}
+        updated += FontService.apply_mapping_set(db, font.id, mappings)
+    return updated
+
+
+def write_decoded(db, svg_file_id: int, output_dir: Path) -> str:
+    svg_file = db.query(SVGFile).filter(SVGFile.id == svg_file_id).first()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # ZIPs may hold same-named SVGs in different folders, the id keeps their outputs apart
+    output_path = output_dir / f'{svg_file.id}_{svg_file.filename}'
+    output_path.write_text(SVGService.decode_svg_file(db, svg_file), encoding='utf-8')
+    return str(output_path)
+
+
+def _init_worker():
+    # Connections inherited from the parent process must not be reused after fork
+    engine.dispose(close=False)
+
+
+def process_unit(unit: Dict[str, Any], mapping_set: Dict[str, Dict[str, str]], decode_to: Optional[str]):
+    """Ingest one unit, apply the mapping set and write decoded SVGs. Runs inside a worker process"""
+    db = SessionLocal()
+    try:
+        if unit['kind'] == 'zip':
+            task_id = f'cli-{uuid.uuid4()}'
+            SVGService.process_zip_path(task_id, Path(unit['path']), Path(unit['path']).name)
+            progress = SVGService.get_progress(task_id)
+            if 'result' not in progress:
+                raise RuntimeError(progress['message'])
+            results = progress['result']['processed_svgs']
+        else:
+            result = SVGService.ingest_svg_path(db, Path(unit['path']), [Path(f) for f in unit['fonts']])
+            results = [result] if result else []
+
+        svg_file_ids = [result['svg_file_id'] for result in results]
+        mapped = sum(apply_mapping_set(db, svg_file_id, mapping_set) for svg_file_id in svg_file_ids)
+        if mapped:
+            SVGService.reindex_decoded_text(db, svg_file_ids)
+
+        outputs = []
+        if decode_to:
+            output_dir = Path(decode_to) / unit['output_dir']
+            outputs = [write_decoded(db, svg_file_id, output_dir) for svg_file_id in svg_file_ids]
+
+        return {'key': unit['key'], 'svg_file_ids': svg_file_ids, 'mapped_glyphs': mapped, 'outputs': outputs}
+    finally:
+        db.close()
+
+
+def cmd_ingest(args) -> int:
+    checkpoint = Path(args.resume) if args.resume else None
+    finished = load_checkpoint(checkpoint)
+    mapping_set = load_mapping_set(Path(args.mappings) if args.mappings else None)
+
+    units = [unit for unit in iter_work_units([Path(s) for s in args.sources]) if unit['key'] not in finished]
+    logger.info(f'{len(units)} units to process ({len(finished)} already finished)')
+    if not units:
+        return 0
+
+    failures = 0
+    started = time.perf_counter()
+    checkpoint_file = open(checkpoint, 'a', encoding='utf-8') if checkpoint else None
+
+    def record(result):
+        logger.info(f'Done {result["key"]}: SVGs {result["svg_file_ids"]}, {result["mapped_glyphs"]} glyphs mapped')
+        if checkpoint_file:
+            checkpoint_file.write(json.dumps(result) + '\n')
+            checkpoint_file.flush()
+
+    try:
+        if args.workers <= 1:
+            for unit in units:
+                try:
+                    record(process_unit(unit, mapping_set, args.decode_to))
+                except Exception:
+                    failures += 1
+                    logger.exception(f'Failed {unit["key"]}')
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(process_unit, unit, mapping_set, args.decode_to): unit for unit in units}
+                for future in as_completed(futures):
+                    try:
+                        record(future.result())
+                    except Exception:
+                        failures += 1
+                        logger.exception(f'Failed {futures[future]["key"]}')
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f'Processed {len(units) - failures}/{len(units)} units in {elapsed:.1f}s ({failures} failed)')
+    return 1 if failures else 0
+
+
+def cmd_export_mappings(args) -> int:
+    """Write every confirmed mapping, grouped by font name, later fonts overriding earlier ones"""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(FontFile.font_name, Glyph.codepoint, Glyph.mapping)
+            .join(Glyph, Glyph.font_file_id == FontFile.id)
+            .filter(Glyph.is_mapped == True, Glyph.is_retired == False)
+            .order_by(FontFile.id)
+            .all()
+        )
+    finally:
+        db.close()
+
+    fonts: Dict[str, Dict[str, str]] = {}
+    for font_name, codepoint, mapping in rows:
+        fonts.setdefault(font_name, {})[codepoint] = mapping
+
+    Path(args.output).write_text(json.dumps({'fonts': fonts}, ensure_ascii=False, indent=2), encoding='utf-8')
+    logger.info(f'Exported {len(rows)} mappings for {len(fonts)} fonts to {args.output}')
+    return 0
+
+
+def cmd_decode(args) -> int:
+    db = SessionLocal()
+    try:
+        query = db.query(SVGFile.id)
+        if args.svg_ids:
+            query = query.filter(SVGFile.id.in_(args.svg_ids))
+        svg_file_ids = [row.id for row in query.order_by(SVGFile.id)]
+        for svg_file_id in svg_file_ids:
+            write_decoded(db, svg_file_id, Path(args.output) / str(svg_file_id))
+    finally:
+        db.close()
+
+    logger.info(f'Decoded {len(svg_file_ids)} SVG files into {args.output}')
+    return 0
+
+
+def cmd_reindex_search(args) -> int:
+    """Rebuild the full-text search index from the current mappings, e.g. for a database created before search"""
+    db = SessionLocal()
+    try:
+        svg_file_ids = [row.id for row in db.query(SVGFile.id).order_by(SVGFile.id)]
+        for start in range(0, len(svg_file_ids), args.batch_size):
+            SVGService.reindex_decoded_text(db, svg_file_ids[start : start + args.batch_size])
+    finally:
+        db.close()
+
+    logger.info(f'Reindexed {len(svg_file_ids)} SVG files')
+    return 0
+
+
+def cmd_compact_svg_content(args) -> int:
+    """Move SVG content stored inline by older versions into deduplicated, compressed blobs"""
+    db = SessionLocal()
+    try:
+        moved, inline_bytes = svg_storage.compact(db, args.batch_size)
+    finally:
+        db.close()
+
+    logger.info(f'Moved {moved} SVG files ({inline_bytes} bytes of inline content) into blob storage')
+    return 0
+
+
+def cmd_gc(args) -> int:
+    """Remove unreferenced upload files, blobs and expired upload sessions, then compact the database"""
+    db = SessionLocal()
+    try:
+        report = StorageGC.run(db, dry_run=args.dry_run, vacuum_full=args.vacuum_full)
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Ingest directory trees, SVGs or ZIPs')
+    ingest.add_argument('sources', nargs='+')
+    ingest.add_argument('--workers', type=int, default=1, help='Worker processes (default: 1, in-process)')
+    ingest.add_argument('--resume', metavar='CHECKPOINT', help='Checkpoint file; finished units are skipped')
+    ingest.add_argument('--mappings', help='Mapping set JSON (from export-mappings) to apply to ingested fonts')
+    ingest.add_argument('--decode-to', metavar='DIR', help='Write decoded SVGs into this directory')
+    ingest.set_defaults(func=cmd_ingest)
+
+    export = subparsers.add_parser('export-mappings', help='Export confirmed glyph mappings as a mapping set')
+    export.add_argument('output')
+    export.set_defaults(func=cmd_export_mappings)
+
+    decode = subparsers.add_parser('decode', help='Write decoded SVGs for files already in the database')
+    decode.add_argument('output')
+    decode.add_argument('--svg-ids', type=int, nargs='*')
+    decode.set_defaults(func=cmd_decode)
+
+    reindex = subparsers.add_parser('reindex-search', help='Rebuild the full-text search index of decoded text')
+    reindex.add_argument('--batch-size', type=int, default=200)
+    reindex.set_defaults(func=cmd_reindex_search)
+
+    compact = subparsers.add_parser('compact-svg-content', help='Move inline SVG content into compressed blobs')
+    compact.add_argument('--batch-size', type=int, default=200)
+    compact.set_defaults(func=cmd_compact_svg_content)
+
+    gc = subparsers.add_parser('gc', help='Collect unreferenced storage and compact the database')
+    gc.add_argument('--dry-run', action='store_true', help='Only report what would be reclaimed')
+    gc.add_argument(
+        '--vacuum-full',
+        action='store_true',
+        help='Rewrite the database once to enable incremental vacuum; blocks writers while it runs',
+    )
+    gc.set_defaults(func=cmd_gc)
+
+    args = parser.parse_args(argv)
+    init_db()
+    ensure_upload_dirs()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,7 +31,49 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = 'PDF Font Analyzer'
     API_PORT: int = 8000
     IS_DEBUG: bool = False
+    DATABASE_URL: str = 'sqlite:///./font_analyzer.db'
     ALLOWED_HOSTS: list[AnyHttpUrl] = []
+    FONT_SUBSET_CACHE_SIZE: int = 128
+    # How long the /svgs total count is reused before it is recounted
+    SVG_COUNT_CACHE_SECONDS: int = 30
+    # Decompressed SVG documents kept in memory, keyed by content hash
+    SVG_CONTENT_CACHE_SIZE: int = 64
+    # Worker threads running background jobs; bulk ingestion never occupies the reserved ones
+    SCHEDULER_WORKERS: int = 4
+    SCHEDULER_RESERVED_WORKERS: int = 1
+    # Queued jobs accepted in total and per client before uploads are refused with 429
+    SCHEDULER_MAX_QUEUED: int = 100
+    SCHEDULER_MAX_QUEUED_PER_CLIENT: int = 10
+    # Largest chunk accepted by resumable uploads and the largest upload accepted at all
+    UPLOAD_MAX_CHUNK_SIZE: int = 16 * 1024 * 1024
+    UPLOAD_MAX_SIZE: int = 4 * 1024 * 1024 * 1024
+    # Longest a mapping-changes long-poll may wait, and how often it re-checks for changes made by other processes
+    SYNC_MAX_WAIT_SECONDS: int = 60
+    SYNC_POLL_SECONDS: float = 2.0
+    # Storage GC never removes files or blobs younger than this, so uploads still being ingested are left alone
+    GC_MIN_AGE_HOURS: float = 24
+    # Resumable uploads idle this long are expired and their records deleted
+    GC_UPLOAD_RETENTION_HOURS: float = 72
+    # Hours between storage GC runs scheduled by the API, 0 disables them
+    GC_INTERVAL_HOURS: float = 24
+    GC_BATCH_SIZE: int = 500
+    # Glyph rows inserted and committed per chunk during font ingestion
+    GLYPH_CHUNK_SIZE: int = 1000
+    # Fraction of HTTP requests to run under cProfile, 0 disables profiling
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = 'profiles'
+    # Reference fonts rendered into the template bank of the offline glyph recognizer
+    RECOGNIZER_FONTS: list[str] = []
+    # Characters to render from each reference font; empty renders every printable character the font covers
+    RECOGNIZER_ALPHABET: str = ''
+    RECOGNIZER_TEMPLATE_SIZE: int = 32
+    # Template suggestions scoring below this normalized cross-correlation are not applied
+    RECOGNIZER_MIN_CONFIDENCE: float = 0.6
+    # Plain-text file, or directory of .txt files, in the document language for the frequency solver
+    SOLVER_CORPUS_PATH: str = ''
+    # Most frequent corpus characters kept as the solver's alphabet
+    SOLVER_ALPHABET_SIZE: int = 200
+    SOLVER_MIN_CONFIDENCE: float = 0.9
 
     class Config:
         case_sensitive = True
@@ -1,37 +1,90 @@
-from .database import Base
+import logging
+from .database import Base, engine
 from datetime import datetime
-from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime
+from sqlalchemy.orm import Session, deferred, relationship
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Text,
+    Boolean,
+    Float,
+    ForeignKey,
+    DateTime,
+    Index,
+    LargeBinary,
+    event,
+    inspect,
+    text,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Full-text index of decoded SVG text, rowid = svg_files.id. FTS5 tables cannot be declared as models
+FTS_TABLE = 'svg_text_fts'
 
 
 class SVGFile(Base):
     __tablename__ = 'svg_files'
+    # Keyset pagination of the newest-first listing
+    __table_args__ = (Index('ix_svg_files_created_at_id', 'created_at', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    content = Column(Text)
+    # Inline content of rows stored before SVG blobs, moved out by `cli compact-svg-content`
+    content = deferred(Column(Text))
+    content_hash = Column(String, ForeignKey('svg_blobs.content_hash'), nullable=True, index=True)
+    size = Column(Integer, nullable=True)
     upload_path = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     fonts = relationship('FontFile', back_populates='svg_file')
 
 
+class SVGBlob(Base):
+    """Compressed SVG document shared by every SVGFile with the same content"""
+
+    __tablename__ = 'svg_blobs'
+
+    content_hash = Column(String, primary_key=True)
+    encoding = Column(String, default='gzip')
+    data = deferred(Column(LargeBinary))
+    size = Column(Integer)
+    compressed_size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class FontFile(Base):
     __tablename__ = 'font_files'
 
     id = Column(Integer, primary_key=True, index=True)
-    svg_file_id = Column(Integer, ForeignKey('svg_files.id'))
+    svg_file_id = Column(Integer, ForeignKey('svg_files.id'), index=True)
+    pdf_file_id = Column(Integer, ForeignKey('pdf_files.id'), nullable=True, index=True)
     font_name = Column(String, index=True)
     filename = Column(String)
     upload_path = Column(String)
+    content_hash = Column(String, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     svg_file = relationship('SVGFile', back_populates='fonts')
-    glyphs = relationship('Glyph', back_populates='font_file')
+    pdf_file = relationship('PDFFile', back_populates='fonts')
+    all_glyphs = relationship('Glyph', back_populates='font_file')
+    # Glyphs still present in the current version of the font
+    glyphs = relationship(
+        'Glyph', primaryjoin='and_(FontFile.id == Glyph.font_file_id, Glyph.is_retired == False)', viewonly=True
+    )
 
 
 class Glyph(Base):
     __tablename__ = 'glyphs'
+    # Covers the grouped mapped/total progress aggregates without touching glyph rows
+    __table_args__ = (
+        Index('ix_glyphs_font_progress', 'font_file_id', 'is_retired', 'is_mapped'),
+        Index('ix_glyphs_font_revision', 'font_file_id', 'revision'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     font_file_id = Column(Integer, ForeignKey('font_files.id'))
@@ -40,5 +93,168 @@ class Glyph(Base):
     rendered_preview = Column(Text, nullable=True)
     mapping = Column(String, default='')
     is_mapped = Column(Boolean, default=False)
+    outline_hash = Column(String, nullable=True, index=True)
+    is_retired = Column(Boolean, default=False, server_default='0', nullable=False)
+    # Mapping revision of the last change to mapping, is_mapped or is_retired, see _stamp_mapping_revisions
+    revision = Column(Integer, default=0, server_default='0', nullable=False, index=True)
+
+    font_file = relationship('FontFile', back_populates='all_glyphs')
+
+
+class GlyphOccurrence(Base):
+    """Inverted index entry: how often a glyph appears in one SVG or PDF"""
+
+    __tablename__ = 'glyph_occurrences'
+
+    id = Column(Integer, primary_key=True, index=True)
+    glyph_id = Column(Integer, ForeignKey('glyphs.id'), index=True)
+    svg_file_id = Column(Integer, ForeignKey('svg_files.id'), nullable=True, index=True)
+    pdf_file_id = Column(Integer, ForeignKey('pdf_files.id'), nullable=True, index=True)
+    count = Column(Integer, default=0)
+
+
+class PDFFile(Base):
+    __tablename__ = 'pdf_files'
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, index=True)
+    upload_path = Column(String)
+    page_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    fonts = relationship('FontFile', back_populates='pdf_file')
+    pages = relationship('PDFPage', back_populates='pdf_file', order_by='PDFPage.page_number')
+
+
+class PDFPage(Base):
+    __tablename__ = 'pdf_pages'
+
+    id = Column(Integer, primary_key=True, index=True)
+    pdf_file_id = Column(Integer, ForeignKey('pdf_files.id'), index=True)
+    page_number = Column(Integer)
+    width = Column(Float)
+    height = Column(Float)
+
+    pdf_file = relationship('PDFFile', back_populates='pages')
+    text_runs = relationship('PDFTextRun', back_populates='page', order_by='PDFTextRun.sequence')
+
+
+class PDFTextRun(Base):
+    """Consecutive glyphs shown with one font on one line of a PDF page"""
+
+    __tablename__ = 'pdf_text_runs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    pdf_page_id = Column(Integer, ForeignKey('pdf_pages.id'), index=True)
+    font_file_id = Column(Integer, ForeignKey('font_files.id'), index=True)
+    sequence = Column(Integer)
+    x = Column(Float)
+    y = Column(Float)
+    # Raw character codes as hex, 2 or 4 digits per code depending on the font's encoding
+    glyph_codes = Column(Text)
+    # JSON list of Glyph.codepoint keys, one per code (null where the code has no glyph)
+    glyph_keys = Column(Text)
+
+    page = relationship('PDFPage', back_populates='text_runs')
+
+
+class UploadSession(Base):
+    """Resumable upload: chunks are appended to a spool file, `received` is the offset the next chunk starts at"""
+
+    __tablename__ = 'upload_sessions'
+
+    id = Column(String, primary_key=True)
+    # 'zip' or 'font'; font uploads are attached to svg_file_id with the given mode when completed
+    kind = Column(String)
+    filename = Column(String)
+    total_size = Column(Integer)
+    received = Column(Integer, default=0)
+    spool_path = Column(String)
+    svg_file_id = Column(Integer, ForeignKey('svg_files.id'), nullable=True)
+    mode = Column(String, nullable=True)
+    # open, completed or aborted
+    status = Column(String, default='open', index=True)
+    task_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SyncCounter(Base):
+    """Named, monotonically increasing counter handing out revisions to incrementally synced changes"""
+
+    __tablename__ = 'sync_counters'
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+MAPPING_COUNTER = 'glyph_mappings'
+# Glyph attributes whose changes are sent to clients syncing mappings. A new outline hash means the glyph was
+# replaced by an incremental font update and its previews changed with it
+SYNCED_GLYPH_ATTRIBUTES = ('mapping', 'is_mapped', 'is_retired', 'outline_hash')
+
+
+def next_revision(session: Session, name: str) -> int:
+    """Increment a sync counter within the session's transaction and return the new value.
+
+    The increment is an UPDATE, so the transaction holds SQLite's write lock from here until it ends. Revisions
+    therefore become visible in the order they were taken, and a reader that has seen revision N never later
+    finds a change numbered N or lower.
+    """
+    increment = update(SyncCounter).where(SyncCounter.name == name).values(value=SyncCounter.value + 1)
+    if not session.execute(increment).rowcount:
+        session.execute(sqlite_insert(SyncCounter).values(name=name, value=0).on_conflict_do_nothing())
+        session.execute(increment)
+    return session.execute(text('SELECT value FROM sync_counters WHERE name = :name'), {'name': name}).scalar()
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_mapping_revisions(session: Session, flush_context, instances):
+    """Give every glyph whose mapping changes in this flush the next mapping revision.
+
+    Catches all ORM writes, whichever code path makes them. Glyph rows bulk-inserted with Core keep revision 0,
+    they belong to a new font that clients load in full.
+    """
+    glyphs = [obj for obj in session.new if isinstance(obj, Glyph)]
+    glyphs += [
+        obj
+        for obj in session.dirty
+        if isinstance(obj, Glyph)
+        and any(inspect(obj).attrs[attribute].history.has_changes() for attribute in SYNCED_GLYPH_ATTRIBUTES)
+    ]
+    if not glyphs:
+        return
+
+    revision = next_revision(session, MAPPING_COUNTER)
+    for glyph in glyphs:
+        glyph.revision = revision
+    session.info['mapping_revision'] = revision
+
+
+def init_db():
+    """Create missing tables and add columns introduced after a database was first created"""
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = f' DEFAULT {column.server_default.arg}' if column.server_default is not None else ''
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+            # create_all only indexes new tables, so indexes added to existing ones are created here
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
-    font_file = relationship('FontFile', back_populates='glyphs')
+        try:
+            conn.execute(
+                text(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                    "USING fts5(text, tokenize='unicode61 remove_diacritics 2')"
+                )
+            )
+        except OperationalError:
+            logger.warning('SQLite was built without FTS5, full-text search is disabled')
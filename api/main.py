@@ -1,18 +1,51 @@
 import sys
+import time
+import asyncio
 from pathlib import Path
+from contextlib import asynccontextmanager
 
 sys.path.append(str(Path(__file__).resolve().parent))
 
-from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+import metrics
 from config import settings
-from database.models import Base
-from database.database import engine
-from routers import svg, fonts, glyphs, ai_mapping
+from database.models import init_db
+from database.database import SessionLocal
+from routers import svg, fonts, glyphs, ai_mapping, pdf, search, uploads
+from services.font_index import font_index
+from services.font_service import ensure_upload_dirs
+from services.scheduler import PRIORITY_BULK, QueueFullError, scheduler
+from services.storage_gc import StorageGC
+
+
+async def collect_storage_periodically(interval_seconds: float):
+    """Queue a storage GC run every interval, as bulk work behind anything a user is waiting on"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        scheduler.submit(StorageGC.run_in_background, priority=PRIORITY_BULK)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup and warm-up run once per server start, importing this module has no side effects
+    init_db()
+    ensure_upload_dirs()
+    db = SessionLocal()
+    try:
+        font_index.warm(db)
+    finally:
+        db.close()
+    gc_task = None
+    if settings.GC_INTERVAL_HOURS > 0:
+        gc_task = asyncio.create_task(collect_storage_periodically(settings.GC_INTERVAL_HOURS * 3600))
+    yield
+    if gc_task:
+        gc_task.cancel()
+    scheduler.shutdown()
 
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -20,6 +53,7 @@ app = FastAPI(
     version='1.0.0',
     debug=settings.IS_DEBUG,
     default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 if settings.ALLOWED_HOSTS:
@@ -31,10 +65,48 @@ if settings.ALLOWED_HOSTS:
         allow_headers=['*'],
     )
 
+
+@app.middleware('http')
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    if metrics.should_profile():
+        with metrics.profiled(f'{request.method} {request.url.path}'):
+            response = await call_next(request)
+    else:
+        response = await call_next(request)
+    duration = time.perf_counter() - start
+
+    # Label by route template rather than raw path to keep series cardinality bounded
+    route = request.scope.get('route')
+    path = getattr(route, 'path', 'unmatched')
+    metrics.http_request_seconds.observe(duration, method=request.method, route=path, status=response.status_code)
+    response.headers['Server-Timing'] = f'app;dur={duration * 1000:.1f}'
+    return response
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, exc: QueueFullError):
+    """Backpressure: refuse work the scheduler cannot queue, telling the client when to retry"""
+    return ORJSONResponse(
+        {'detail': str(exc), 'retry_after': exc.retry_after},
+        status_code=429,
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
 app.include_router(svg.router, prefix='/api')
 app.include_router(fonts.router, prefix='/api')
 app.include_router(glyphs.router, prefix='/api')
 app.include_router(ai_mapping.router, prefix='/api')
+app.include_router(pdf.router, prefix='/api')
+app.include_router(search.router, prefix='/api')
+app.include_router(uploads.router, prefix='/api')
+
+
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of hot-path timings and counters"""
+    return PlainTextResponse(metrics.render_metrics(), media_type='text/plain; version=0.0.4')
 
 
 @app.get('/')
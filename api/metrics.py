@@ -0,0 +1,159 @@
+import time
+import random
+import logging
+import cProfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(key)} {value}'
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # label key -> (bucket counts, sum, count)
+        self._values: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{_format_labels(key, [("le", str(bound))])} {bucket_count}'
+            yield f'{self.name}_bucket{_format_labels(key, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_format_labels(key)} {total}'
+            yield f'{self.name}_count{_format_labels(key)} {count}'
+
+
+span_seconds = Histogram('pdf_font_decoder_span_seconds', 'Duration of instrumented hot-path spans')
+http_request_seconds = Histogram('pdf_font_decoder_http_request_seconds', 'HTTP request duration by route')
+glyphs_processed = Counter('pdf_font_decoder_glyphs_processed_total', 'Glyphs processed by operation')
+cache_requests = Counter('pdf_font_decoder_cache_requests_total', 'Cache lookups by cache and result')
+errors = Counter('pdf_font_decoder_errors_total', 'Errors by component')
+jobs = Counter('pdf_font_decoder_jobs_total', 'Background jobs by priority and outcome')
+gc_reclaimed_bytes = Counter('pdf_font_decoder_gc_reclaimed_bytes_total', 'Bytes reclaimed by storage GC by kind')
+job_wait_seconds = Histogram('pdf_font_decoder_job_wait_seconds', 'Time background jobs spent queued by priority')
+
+REGISTRY = [
+    span_seconds,
+    http_request_seconds,
+    glyphs_processed,
+    cache_requests,
+    errors,
+    jobs,
+    job_wait_seconds,
+    gc_reclaimed_bytes,
+]
+
+# cProfile allows a single active profiler, overlapping samples are skipped
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def span(name: str):
+    """Time a block of work into the span histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        span_seconds.observe(duration, span=name)
+        logger.debug(f'{name} took {duration * 1000:.1f}ms')
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def should_profile() -> bool:
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profiled(label: str):
+    """Run the block under cProfile and dump the stats into PROFILE_DIR"""
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        profile_dir = Path(settings.PROFILE_DIR)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+        path = profile_dir / f'{int(time.time() * 1000)}_{safe_label}.prof'
+        profiler.dump_stats(path)
+        logger.info(f'Wrote profile {path}')
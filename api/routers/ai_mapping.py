@@ -1,24 +1,50 @@
+import logging
+from typing import Literal
 from sqlalchemy.orm import Session
+from config import settings
+from metrics import errors as error_counter, glyphs_processed
 from database.session import get_db
 from database.models import FontFile, Glyph
 from services.font_service import FontService
+from services.svg_service import SVGService
 from fastapi import APIRouter, Depends, HTTPException
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=['AI Mapping'])
 
 @router.post('/fonts/{font_id}/generate-ai-suggestions')
-async def generate_ai_suggestions(font_id: int, db: Session = Depends(get_db)):
-    """Generate AI suggestions for all unmapped glyphs in a font using existing rendered previews"""
-    
+async def generate_ai_suggestions(
+    font_id: int, backend: Literal['gemini', 'template', 'frequency'] = 'gemini', db: Session = Depends(get_db)
+):
+    """Generate AI suggestions for all unmapped glyphs in a font using existing rendered previews.
+
+    `backend=template` uses the offline template recognizer instead of Gemini: one batched comparison against
+    the reference fonts in RECOGNIZER_FONTS, applying only suggestions above RECOGNIZER_MIN_CONFIDENCE.
+    `backend=frequency` solves the font as a substitution cipher over the text of every SVG and PDF using it,
+    needs no previews, and applies suggestions above SOLVER_MIN_CONFIDENCE.
+    """
+    # Both offline backends pull in numpy, import them only when used to keep startup fast
+    from services.glyph_recognizer import TemplateBankError, glyph_recognizer
+    from services.frequency_solver import FrequencySolver
+
+    if backend == 'template' and not glyph_recognizer.is_available():
+        raise HTTPException(status_code=501, detail='Template recognizer needs numpy and RECOGNIZER_FONTS')
+    if backend == 'frequency' and not FrequencySolver.is_available():
+        raise HTTPException(status_code=501, detail='Frequency solver needs numpy and SOLVER_CORPUS_PATH')
+
     font_file = db.query(FontFile).filter(FontFile.id == font_id).first()
     if not font_file:
         raise HTTPException(status_code=404, detail='Font not found')
     
-    unmapped_glyphs = db.query(Glyph).filter(
+    query = db.query(Glyph).filter(
         Glyph.font_file_id == font_id,
         Glyph.mapping == '',
-        Glyph.rendered_preview.isnot(None)
-    ).all()
+        Glyph.is_retired == False
+    )
+    if backend != 'frequency':
+        query = query.filter(Glyph.rendered_preview.isnot(None))
+    unmapped_glyphs = query.all()
     
     if not unmapped_glyphs:
         return {
@@ -33,35 +59,110 @@ async def generate_ai_suggestions(font_id: int, db: Session = Depends(get_db)):
     processed = 0
     errors = 0
     
-    # print(f"Processing {len(unmapped_glyphs)} unmapped glyphs for font '{font_file.font_name}'")
+    logger.info(f"Processing {len(unmapped_glyphs)} unmapped glyphs for font '{font_file.font_name}'")
     
-    for glyph in unmapped_glyphs:
+    if backend == 'template':
+        try:
+            candidates = glyph_recognizer.rank([glyph.rendered_preview for glyph in unmapped_glyphs], top_k=1)
+        except TemplateBankError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        suggestions = [
+            ranked[0]['char'] if ranked and ranked[0]['confidence'] >= settings.RECOGNIZER_MIN_CONFIDENCE else None
+            for ranked in candidates
+        ]
+    elif backend == 'frequency':
+        proposals = {
+            proposal['glyph_id']: proposal['mapping']
+            for proposal in FrequencySolver.propose_mappings(db, font_id)
+            if proposal['confidence'] >= settings.SOLVER_MIN_CONFIDENCE
+        }
+        suggestions = [proposals.get(glyph.id) for glyph in unmapped_glyphs]
+    else:
+        suggestions = None
+
+    for index, glyph in enumerate(unmapped_glyphs):
         try:
-            ai_char = FontService.get_ai_suggestion_for_png(glyph.rendered_preview)
+            if suggestions is not None:
+                ai_char = suggestions[index]
+            else:
+                ai_char = FontService.get_ai_suggestion_for_png(glyph.rendered_preview)
             
             if ai_char and ai_char.strip():
                 glyph.mapping = ai_char.strip()
                 glyph.is_mapped = True
                 processed += 1
-                # print(f"  {glyph.codepoint} → '{ai_char}'")
+                logger.debug(f"  {glyph.codepoint} → '{ai_char}'")
             else:
                 errors += 1
-                # print(f"  {glyph.codepoint} → AI failed")
+                logger.debug(f"  {glyph.codepoint} → AI failed")
                 
         except Exception as e:
             errors += 1
-            # print(f"  {glyph.codepoint} → Error: {e}")
+            logger.debug(f"  {glyph.codepoint} → Error: {e}")
     
     db.commit()
+    if processed:
+        SVGService.schedule_reindex([font_file.svg_file_id])
     
-    # print(f"AI processing complete: {processed} processed, {errors} errors")
+    glyphs_processed.inc(processed, operation='ai' if backend == 'gemini' else backend)
+    error_counter.inc(errors, component='ai_mapping')
+    logger.info(f"AI processing complete: {processed} processed, {errors} errors")
     
     return {
         'font_id': font_id,
         'font_name': font_file.font_name,
+        'backend': backend,
         'processed': processed,
         'errors': errors,
         'total_unmapped': len(unmapped_glyphs),
         'success_rate': round((processed / len(unmapped_glyphs)) * 100, 1) if unmapped_glyphs else 0,
         'message': f'AI processed {processed} out of {len(unmapped_glyphs)} unmapped glyphs'
-    }
\ No newline at end of file
+    }
+
+
+@router.get('/fonts/{font_id}/template-candidates')
+async def get_template_candidates(font_id: int, top_k: int = 5, db: Session = Depends(get_db)):
+    """Ranked template-recognizer candidates with confidence scores for every unmapped glyph with a preview"""
+    from services.glyph_recognizer import TemplateBankError, glyph_recognizer
+
+    if not glyph_recognizer.is_available():
+        raise HTTPException(status_code=501, detail='Template recognizer needs numpy and RECOGNIZER_FONTS')
+
+    font_file = db.query(FontFile).filter(FontFile.id == font_id).first()
+    if not font_file:
+        raise HTTPException(status_code=404, detail='Font not found')
+
+    glyphs = db.query(Glyph.id, Glyph.codepoint, Glyph.rendered_preview).filter(
+        Glyph.font_file_id == font_id,
+        Glyph.mapping == '',
+        Glyph.rendered_preview.isnot(None),
+        Glyph.is_retired == False
+    ).all()
+
+    try:
+        candidates = glyph_recognizer.rank([glyph.rendered_preview for glyph in glyphs], top_k=max(1, min(top_k, 50)))
+    except TemplateBankError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        'font_id': font_id,
+        'glyphs': [
+            {'glyph_id': glyph.id, 'codepoint': glyph.codepoint, 'candidates': ranked}
+            for glyph, ranked in zip(glyphs, candidates)
+        ],
+    }
+
+
+@router.get('/fonts/{font_id}/frequency-candidates')
+async def get_frequency_candidates(font_id: int, top_k: int = 3, db: Session = Depends(get_db)):
+    """Frequency-solver proposals with confidences for unmapped glyphs, most frequent glyphs first"""
+    from services.frequency_solver import FrequencySolver
+
+    if not FrequencySolver.is_available():
+        raise HTTPException(status_code=501, detail='Frequency solver needs numpy and SOLVER_CORPUS_PATH')
+
+    font_file = db.query(FontFile).filter(FontFile.id == font_id).first()
+    if not font_file:
+        raise HTTPException(status_code=404, detail='Font not found')
+
+    return {'font_id': font_id, 'glyphs': FrequencySolver.propose_mappings(db, font_id, max(1, min(top_k, 20)))}
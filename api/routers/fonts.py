@@ -1,65 +1,100 @@
-from typing import List
-from pathlib import Path
-from fastapi.responses import FileResponse
+import asyncio
+import logging
+from typing import List, Literal, Optional
 from sqlalchemy.orm import Session, selectinload
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 
 from database.session import get_db
+from database.database import SessionLocal
 from database.models import FontFile, SVGFile
 from services.font_service import FontService
+from services.svg_service import SVGService
+from services.font_index import font_index
+from services.font_serving import FontServing
+from services.mapping_sync import mapping_feed
+from services.scheduler import PRIORITY_INTERACTIVE, client_key, scheduler
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=['Fonts'])
 
 
 @router.get('/font-file/{font_id}')
-async def get_font_file(font_id: int, db: Session = Depends(get_db)):
-    font_file = db.query(FontFile).filter(FontFile.id == font_id).first()
-    if not font_file:
+async def get_font_file(font_id: int, request: Request, text: Optional[str] = None, db: Session = Depends(get_db)):
+    """Serve a font file; pass `text` to receive a WOFF subset containing only the glyphs it needs"""
+    entry = font_index.get(font_id, db)
+    if not entry:
         raise HTTPException(status_code=404, detail='Font file not found')
 
-    file_path = Path(font_file.upload_path)
-    if not file_path.exists():
+    try:
+        return await run_in_threadpool(FontServing.build_response, request, font_id, entry, text)
+    except FileNotFoundError:
+        font_index.discard(font_id)
         raise HTTPException(status_code=404, detail='Font file not found on disk')
 
-    media_type = 'font/woff2' if font_file.filename.endswith('.woff2') else 'font/woff'
-
-    return FileResponse(
-        path=str(file_path),
-        media_type=media_type,
-        headers={'Access-Control-Allow-Origin': '*', 'Cache-Control': 'public, max-age=31536000'},
-    )
-
 
 @router.post('/upload-fonts/{svg_file_id}')
-async def upload_fonts(svg_file_id: int, files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
-    """Upload font files for an SVG"""
+async def upload_fonts(
+    svg_file_id: int,
+    files: List[UploadFile] = File(...),
+    mode: Literal['new', 'update'] = 'new',
+    db: Session = Depends(get_db),
+):
+    """Upload font files for an SVG.
+
+    With `mode=update`, a file whose name matches a font already attached to the SVG replaces that font in place,
+    keeping existing glyph mappings instead of creating a fresh, unmapped font.
+    """
     svg_file = db.query(SVGFile).filter(SVGFile.id == svg_file_id).first()
     if not svg_file:
         raise HTTPException(status_code=404, detail='SVG file not found')
 
     uploaded_fonts = []
+    failed_fonts = []
 
     for file in files:
         if not (file.filename.endswith('.woff') or file.filename.endswith('.woff2')):
             continue
 
         content = await file.read()
-        font_result = FontService.save_font_file(content, file.filename, svg_file_id, db)
-        uploaded_fonts.append(font_result)
+        try:
+            uploaded_fonts.append(FontService.store_uploaded_font(db, svg_file_id, content, file.filename, mode))
+        except Exception as e:
+            # Skipped like an unreadable new font, the fonts stored before it are still indexed below
+            logger.warning(f'Could not process font {file.filename}: {e}')
+            failed_fonts.append({'filename': file.filename, 'error': str(e)})
+
+    if uploaded_fonts:
+        SVGService.index_glyph_occurrences(db, svg_file_id, [font['font_id'] for font in uploaded_fonts])
+        SVGService.reindex_decoded_text(db, [svg_file_id])
 
     return {
         'svg_file_id': svg_file_id,
         'uploaded_fonts': uploaded_fonts,
+        'failed_fonts': failed_fonts,
         'message': f'Uploaded {len(uploaded_fonts)} font files',
     }
 
 
 @router.get('/fonts/{svg_file_id}')
-async def get_fonts(svg_file_id: int, db: Session = Depends(get_db)):
+async def get_fonts(svg_file_id: int, order: Literal['default', 'usage'] = 'default', db: Session = Depends(get_db)):
+    """Fonts and glyphs of an SVG; `order=usage` lists the most frequently used glyphs first.
+
+    `revision` is the mapping revision the tree reflects, pass it to /mappings/changes to receive later edits.
+    """
+    # Read before the tree, so edits made while it loads are still returned by /mappings/changes
+    revision = mapping_feed.current_revision(db)
     fonts = db.query(FontFile).filter(FontFile.svg_file_id == svg_file_id).options(selectinload(FontFile.glyphs)).all()
 
+    # Glyph ids are unique across fonts, one lookup serves all of them
+    usage = FontService.get_glyph_usage_for_fonts(db, [font.id for font in fonts])
+
     result = []
     for font in fonts:
+        glyphs = font.glyphs
+        if order == 'usage':
+            glyphs = sorted(glyphs, key=lambda glyph: -usage.get(glyph.id, 0))
         result.append(
             {
                 'font_id': font.id,
@@ -74,26 +109,35 @@ async def get_fonts(svg_file_id: int, db: Session = Depends(get_db)):
                         'rendered_preview': glyph.rendered_preview,
                         'mapping': glyph.mapping,
                         'is_mapped': glyph.is_mapped,
+                        'occurrences': usage.get(glyph.id, 0),
                     }
-                    for glyph in font.glyphs
+                    for glyph in glyphs
                 ],
             }
         )
 
-    return {'fonts': result}
+    return {'fonts': result, 'revision': revision}
 
 
 @router.post('/fonts/{font_id}/generate-png-previews')
-async def generate_png_previews(font_id: int, db: Session = Depends(get_db)):
-    """Generate PNG previews for all glyphs in a font"""
+async def generate_png_previews(font_id: int, request: Request, db: Session = Depends(get_db)):
+    """Generate PNG previews for all glyphs in a font, as interactive work ahead of queued bulk ingestion"""
     
     # Check if font exists
     font_file = db.query(FontFile).filter(FontFile.id == font_id).first()
     if not font_file:
         raise HTTPException(status_code=404, detail='Font file not found')
-    
-    # Generate PNG previews
-    result = FontService.generate_png_previews_for_font(db, font_id)
+
+    def render():
+        render_db = SessionLocal()
+        try:
+            return FontService.generate_png_previews_for_font(render_db, font_id)
+        finally:
+            render_db.close()
+
+    # Rendering runs on a scheduler worker instead of blocking the event loop
+    job = scheduler.submit(render, priority=PRIORITY_INTERACTIVE, client=client_key(request))
+    result = await asyncio.wrap_future(job.future)
     
     if not result['success']:
         raise HTTPException(status_code=500, detail=result.get('error', 'Failed to generate PNG previews'))
@@ -1,14 +1,21 @@
+import asyncio
+import time
+from typing import Optional
 from database.models import Glyph
 from sqlalchemy.orm import Session
+from config import settings
 from database.session import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from services.font_service import FontService
+from services.svg_service import SVGService
+from services.mapping_sync import mapping_feed
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 router = APIRouter(tags=['Glyphs'])
 
 
 @router.put('/glyph/{glyph_id}/mapping')
 async def update_glyph_mapping(glyph_id: int, mapping_data: dict, db: Session = Depends(get_db)):
-    """Update glyph mapping"""
+    """Update glyph mapping. The response lists the SVGs and PDFs whose decoded text needs refreshing"""
     glyph = db.query(Glyph).filter(Glyph.id == glyph_id).first()
     if not glyph:
         raise HTTPException(status_code=404, detail='Glyph not found')
@@ -17,4 +24,45 @@ async def update_glyph_mapping(glyph_id: int, mapping_data: dict, db: Session =
     glyph.is_mapped = bool(glyph.mapping.strip())
     db.commit()
 
-    return {'glyph_id': glyph.id, 'mapping': glyph.mapping, 'is_mapped': glyph.is_mapped}
+    affected = FontService.get_affected_documents(db, glyph.id)
+    SVGService.schedule_reindex(affected['svg_file_ids'])
+
+    return {
+        'glyph_id': glyph.id,
+        'mapping': glyph.mapping,
+        'is_mapped': glyph.is_mapped,
+        'revision': glyph.revision,
+        'affected': affected,
+    }
+
+
+@router.get('/mappings/changes')
+async def get_mapping_changes(
+    since: int = Query(0, ge=0),
+    font_id: Optional[int] = None,
+    svg_file_id: Optional[int] = None,
+    wait: float = Query(0, ge=0, le=settings.SYNC_MAX_WAIT_SECONDS),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """Glyph mappings changed after revision `since`, optionally limited to one font or one SVG's fonts.
+
+    Start from the `revision` returned by /fonts/{svg_file_id} and pass each response's `revision` as the next
+    `since`. With `wait`, the request is held for up to that many seconds until a change arrives (long-poll).
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        waiter = mapping_feed.listen()
+        try:
+            result = mapping_feed.changes_since(db, since, font_id, svg_file_id, limit)
+            # Hand the connection back to the pool while idle, a waiting editor should not hold one
+            db.close()
+            remaining = deadline - time.monotonic()
+            if result['changes'] or remaining <= 0:
+                return result
+            try:
+                await asyncio.wait_for(waiter.wait(), min(remaining, settings.SYNC_POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            mapping_feed.unlisten(waiter)
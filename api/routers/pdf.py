@@ -0,0 +1,90 @@
+import uuid
+from pathlib import Path
+from sqlalchemy.orm import Session, selectinload
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request
+
+from database.session import get_db
+from database.models import PDFFile, PDFPage
+from services.font_service import FontService, UPLOAD_DIR
+from services.pdf_service import PDFService, PYPDF_AVAILABLE
+from services.scheduler import QueueFullError, client_key
+
+router = APIRouter(tags=['PDF'])
+
+# Bytes read from the request per await while spooling an upload
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+@router.post('/upload-pdf')
+async def upload_pdf(request: Request, file: UploadFile = File(...)):
+    """Upload a PDF; embedded fonts and per-page text runs are extracted in the background"""
+    if not PYPDF_AVAILABLE:
+        raise HTTPException(status_code=501, detail='PDF support requires pypdf')
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail='Only PDF files are allowed')
+
+    # Spool to disk instead of memory: the reader works page by page from the file
+    filename = Path(file.filename).name
+    pdf_path = UPLOAD_DIR / 'pdf' / f'{uuid.uuid4()}_{filename}'
+    with open(pdf_path, 'wb') as f:
+        while chunk := await file.read(SPOOL_CHUNK_SIZE):
+            f.write(chunk)
+
+    try:
+        task_id = PDFService.start_pdf_processing(pdf_path, filename, client_key(request))
+    except QueueFullError:
+        pdf_path.unlink(missing_ok=True)
+        raise
+
+    return {'message': 'PDF upload started, processing in background', 'task_id': task_id, 'status': 'processing'}
+
+
+@router.get('/pdfs/{pdf_file_id}')
+async def get_pdf(pdf_file_id: int, db: Session = Depends(get_db)):
+    pdf_file = db.query(PDFFile).filter(PDFFile.id == pdf_file_id).first()
+    if not pdf_file:
+        raise HTTPException(status_code=404, detail='PDF file not found')
+
+    progress = FontService.get_mapping_progress(db, pdf_file_id=pdf_file_id)
+
+    return {
+        'id': pdf_file.id,
+        'filename': pdf_file.filename,
+        'page_count': pdf_file.page_count,
+        'created_at': pdf_file.created_at,
+        'fonts': [
+            {
+                'font_id': font_id,
+                'font_name': font['font_name'],
+                'filename': font['filename'],
+                'font_url': f'/font-file/{font_id}',
+                'total_glyphs': font['total'],
+                'mapped_glyphs': font['mapped'],
+            }
+            for font_id, font in sorted(progress.items())
+        ],
+    }
+
+
+@router.get('/pdfs/{pdf_file_id}/pages/{page_number}/text')
+async def get_pdf_page_text(pdf_file_id: int, page_number: int, db: Session = Depends(get_db)):
+    """Text runs of a page decoded with the current glyph mappings"""
+    page = (
+        db.query(PDFPage)
+        .filter(PDFPage.pdf_file_id == pdf_file_id, PDFPage.page_number == page_number)
+        .options(selectinload(PDFPage.text_runs))
+        .first()
+    )
+    if not page:
+        raise HTTPException(status_code=404, detail='PDF page not found')
+
+    runs = PDFService.decode_page(db, page)
+
+    return {
+        'pdf_file_id': pdf_file_id,
+        'page_number': page.page_number,
+        'width': page.width,
+        'height': page.height,
+        'runs': runs,
+        'text': '\n'.join(run['text'] for run in runs),
+    }
@@ -0,0 +1,42 @@
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from database.session import get_db
+from database.models import SVGFile
+from services.search_service import SearchService, SearchQueryError
+
+router = APIRouter(tags=['Search'])
+
+
+@router.get('/search')
+async def search_decoded_text(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Search the decoded text of all SVGs; every term must match, results carry highlighted snippets"""
+    if not SearchService.is_available(db):
+        raise HTTPException(status_code=501, detail='Full-text search requires SQLite with FTS5')
+
+    try:
+        found = SearchService.search(db, q, (page - 1) * limit, limit)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid search query: {e}')
+
+    svg_ids = [result['svg_file_id'] for result in found['results']]
+    filenames = dict(db.query(SVGFile.id, SVGFile.filename).filter(SVGFile.id.in_(svg_ids)).all())
+    total = found['total']
+
+    return {
+        'query': q,
+        'results': [{**result, 'filename': filenames.get(result['svg_file_id'])} for result in found['results']],
+        'pagination': {
+            'current_page': page,
+            'total_pages': (total + limit - 1) // limit,
+            'total_items': total,
+            'items_per_page': limit,
+            'has_next': page * limit < total,
+            'has_previous': page > 1,
+        },
+    }
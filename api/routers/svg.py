@@ -1,11 +1,16 @@
-from typing import List
+import uuid
+import shutil
+from typing import List, Literal, Optional
 from datetime import datetime
 from pydantic import BaseModel
 from sqlalchemy.orm import Session, selectinload
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Query, Request
 
 from database.session import get_db
 from services.svg_service import SVGService
+from services.svg_storage import svg_storage
+from services.scheduler import QueueFullError, client_key, scheduler
+from services.font_service import FontService, UPLOAD_DIR
 from database.models import SVGFile, FontFile
 
 
@@ -36,15 +41,22 @@ router = APIRouter(tags=['SVG'])
 
 
 @router.post('/upload-zip')
-async def upload_zip(file: UploadFile = File(...)):
-    """Upload ZIP file containing SVG and font files, process all SVGs"""
+async def upload_zip(request: Request, file: UploadFile = File(...)):
+    """Upload ZIP file containing SVG and font files, process all SVGs. Answers 429 when the queue is full"""
 
     if not file.filename.endswith('.zip'):
         raise HTTPException(status_code=400, detail='Only ZIP files are allowed')
 
-    content = await file.read()
+    # Spool to disk instead of memory; the spooled file is processed in place and removed afterwards
+    zip_path = UPLOAD_DIR / 'spool' / f'{uuid.uuid4()}.zip'
+    with open(zip_path, 'wb') as f:
+        shutil.copyfileobj(file.file, f)
 
-    task_id = SVGService.start_zip_processing(content, file.filename)
+    try:
+        task_id = SVGService.start_zip_processing(zip_path, file.filename, client_key(request))
+    except QueueFullError:
+        zip_path.unlink(missing_ok=True)
+        raise
 
     return {'message': 'ZIP upload started, processing in background', 'task_id': task_id, 'status': 'processing'}
 
@@ -73,7 +85,7 @@ async def get_source_of_truth_svg(svg_file_id: int, request: Request, db: Sessio
     if not svg_file:
         raise HTTPException(status_code=404, detail='SVG file not found')
 
-    content_with_fonts = SVGService.fix_font_urls_in_svg(svg_file.content, svg_file_id, db, request)
+    content_with_fonts = SVGService.fix_font_urls_in_svg(svg_storage.load(db, svg_file), svg_file_id, db, request)
 
     return {'source_of_truth_content': content_with_fonts}
 
@@ -91,27 +103,108 @@ async def get_upload_progress(task_id: str):
     return SVGService.get_progress(task_id)
 
 
-@router.get('/svgs')
-async def get_all_svgs(page: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    """Get paginated list of all processed SVG files"""
-    offset = (page - 1) * limit
+@router.delete('/upload-progress/{task_id}')
+async def cancel_upload(task_id: str):
+    """Cancel a queued or running ZIP/PDF task; a running task stops after its current file or page"""
+    status = scheduler.cancel(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail='Task not found or already finished')
+    return {'task_id': task_id, 'status': status}
 
-    total = db.query(SVGFile).count()
 
-    svgs = db.query(SVGFile).order_by(SVGFile.created_at.desc()).offset(offset).limit(limit).all()
+def _progress_by_svg(font_progress):
+    progress = {}
+    for counts in font_progress.values():
+        svg = progress.setdefault(counts['svg_file_id'], {'mapped_glyphs': 0, 'total_glyphs': 0, 'font_count': 0})
+        svg['mapped_glyphs'] += counts['mapped']
+        svg['total_glyphs'] += counts['total']
+        svg['font_count'] += 1
+    return progress
 
-    svg_list = []
-    for svg in svgs:
-        svg_list.append({'svg_file_id': svg.id, 'filename': svg.filename, 'upload_date': svg.created_at.isoformat()})
+
+@router.get('/svgs/summary')
+async def get_svgs_summary(db: Session = Depends(get_db)):
+    """Mapping progress over all SVGs, from one grouped aggregate instead of loading glyphs"""
+    progress = _progress_by_svg(FontService.get_mapping_progress(db))
+    progress.pop(None, None)
+    mapped = sum(svg['mapped_glyphs'] for svg in progress.values())
+    total = sum(svg['total_glyphs'] for svg in progress.values())
 
     return {
-        'svgs': svg_list,
-        'pagination': {
-            'current_page': page,
-            'total_pages': (total + limit - 1) // limit,
-            'total_items': total,
-            'items_per_page': limit,
-            'has_next': page * limit < total,
-            'has_previous': page > 1,
-        },
+        'svg_count': db.query(SVGFile).count(),
+        'font_count': sum(svg['font_count'] for svg in progress.values()),
+        'mapped_glyphs': mapped,
+        'total_glyphs': total,
+        'percentage': round(mapped / total * 100, 1) if total else 0,
+        'fully_mapped_svgs': sum(
+            1 for svg in progress.values() if svg['total_glyphs'] and svg['mapped_glyphs'] == svg['total_glyphs']
+        ),
     }
+
+
+@router.get('/svg/{svg_file_id}/progress')
+async def get_svg_progress(svg_file_id: int, db: Session = Depends(get_db)):
+    """Per-font mapped/total glyph counts of an SVG"""
+    if not db.query(SVGFile.id).filter(SVGFile.id == svg_file_id).first():
+        raise HTTPException(status_code=404, detail='SVG file not found')
+
+    fonts = FontService.get_mapping_progress(db, [svg_file_id])
+    return {
+        'svg_file_id': svg_file_id,
+        'mapped_glyphs': sum(font['mapped'] for font in fonts.values()),
+        'total_glyphs': sum(font['total'] for font in fonts.values()),
+        'fonts': [
+            {
+                'font_id': font_id,
+                'font_name': font['font_name'],
+                'mapped_glyphs': font['mapped'],
+                'total_glyphs': font['total'],
+            }
+            for font_id, font in fonts.items()
+        ],
+    }
+
+
+@router.get('/svgs')
+async def get_all_svgs(
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    filename: Optional[str] = None,
+    status: Optional[Literal['unmapped', 'partial', 'complete']] = None,
+    db: Session = Depends(get_db),
+):
+    """Get paginated list of all processed SVG files, newest first.
+
+    Pass `next_cursor` from the previous response as `cursor` to page forward without OFFSET; `page` still works
+    and is the only mode that reports page numbers.
+    Filter by a `filename` substring or by mapping `status`.
+    """
+    try:
+        svgs, next_cursor = SVGService.list_svgs(
+            db, limit, cursor=cursor, offset=0 if cursor else (page - 1) * limit, filename=filename, status=status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total = SVGService.count_svgs(db, filename, status)
+    progress = _progress_by_svg(FontService.get_mapping_progress(db, [svg.id for svg in svgs]))
+
+    svg_list = []
+    for svg in svgs:
+        counts = progress.get(svg.id, {'mapped_glyphs': 0, 'total_glyphs': 0, 'font_count': 0})
+        svg_list.append(
+            {'svg_file_id': svg.id, 'filename': svg.filename, 'upload_date': svg.created_at.isoformat(), **counts}
+        )
+
+    pagination = {
+        'total_items': total,
+        'items_per_page': limit,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
+    }
+    if not cursor:
+        # Page numbers only mean something when paging by number, cursor pages only lead forward
+        pagination.update({'total_pages': (total + limit - 1) // limit, 'current_page': page, 'has_previous': page > 1})
+
+    return {'svgs': svg_list, 'pagination': pagination}
@@ -0,0 +1,203 @@
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, Dict, Literal, Optional
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from config import settings
+from database.session import get_db
+from database.database import SessionLocal
+from database.models import SVGFile, UploadSession
+from services.font_service import FontService, UPLOAD_DIR
+from services.svg_service import SVGService
+from services.scheduler import QueueFullError, client_key
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=['Uploads'])
+
+SUFFIXES = {'zip': ('.zip',), 'font': ('.woff', '.woff2')}
+
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+    kind: Literal['zip', 'font'] = 'zip'
+    # Font uploads only: the SVG the font belongs to and how it is attached, as for /upload-fonts
+    svg_file_id: Optional[int] = None
+    mode: Literal['new', 'update'] = 'new'
+
+
+def _upload_out(upload: UploadSession) -> Dict[str, Any]:
+    return {
+        'upload_id': upload.id,
+        'kind': upload.kind,
+        'filename': upload.filename,
+        'size': upload.total_size,
+        'offset': upload.received,
+        'status': upload.status,
+        'task_id': upload.task_id,
+    }
+
+
+def _get_upload(db: Session, upload_id: str) -> UploadSession:
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not upload:
+        raise HTTPException(status_code=404, detail='Upload not found')
+    return upload
+
+
+def _offset_conflict(upload: UploadSession, detail: str) -> HTTPException:
+    return HTTPException(status_code=409, detail=detail, headers={'Upload-Offset': str(upload.received)})
+
+
+@router.post('/uploads')
+async def init_upload(body: UploadInit, db: Session = Depends(get_db)):
+    """Start a resumable upload of a ZIP or a font; send its bytes in order with PUT /uploads/{upload_id}"""
+    if not body.filename.lower().endswith(SUFFIXES[body.kind]):
+        raise HTTPException(status_code=400, detail=f'Only {", ".join(SUFFIXES[body.kind])} files are allowed')
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail='Upload size must be positive')
+    if body.size > settings.UPLOAD_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f'Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes')
+    if body.kind == 'font' and not db.query(SVGFile.id).filter(SVGFile.id == body.svg_file_id).first():
+        raise HTTPException(status_code=404, detail='SVG file not found')
+
+    upload_id = uuid.uuid4().hex
+    spool_path = UPLOAD_DIR / 'spool' / upload_id
+    spool_path.touch()
+    upload = UploadSession(
+        id=upload_id,
+        kind=body.kind,
+        filename=Path(body.filename).name,
+        total_size=body.size,
+        received=0,
+        spool_path=str(spool_path),
+        svg_file_id=body.svg_file_id if body.kind == 'font' else None,
+        mode=body.mode if body.kind == 'font' else None,
+    )
+    db.add(upload)
+    db.commit()
+
+    return {**_upload_out(upload), 'max_chunk_size': settings.UPLOAD_MAX_CHUNK_SIZE}
+
+
+@router.get('/uploads/{upload_id}')
+async def get_upload(upload_id: str, db: Session = Depends(get_db)):
+    """State of an upload; a client resuming after a dropped connection continues at `offset`"""
+    return _upload_out(_get_upload(db, upload_id))
+
+
+@router.put('/uploads/{upload_id}')
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0), db: Session = Depends(get_db)):
+    """Append the raw request body at `offset`, which must equal the bytes received so far.
+
+    The body is streamed straight into the spool file. The stored offset only advances once the whole chunk is
+    written, so a chunk cut off by a dropped connection is simply sent again from the same offset.
+    """
+    upload = _get_upload(db, upload_id)
+    if upload.status != 'open':
+        raise HTTPException(status_code=409, detail=f'Upload is {upload.status}')
+    if offset != upload.received:
+        raise _offset_conflict(upload, f'Expected offset {upload.received}')
+
+    written = 0
+    with open(upload.spool_path, 'r+b') as f:
+        f.seek(offset)
+        async for data in request.stream():
+            written += len(data)
+            if written > settings.UPLOAD_MAX_CHUNK_SIZE:
+                raise HTTPException(
+                    status_code=413, detail=f'Chunks are limited to {settings.UPLOAD_MAX_CHUNK_SIZE} bytes'
+                )
+            if offset + written > upload.total_size:
+                raise HTTPException(status_code=413, detail='Chunk extends past the declared upload size')
+            f.write(data)
+
+    # Conditional on the offset, so of two concurrent writers of the same chunk only one advances it
+    advanced = (
+        db.query(UploadSession)
+        .filter(UploadSession.id == upload_id, UploadSession.status == 'open', UploadSession.received == offset)
+        .update({'received': offset + written}, synchronize_session=False)
+    )
+    db.commit()
+    if not advanced:
+        db.refresh(upload)
+        raise _offset_conflict(upload, 'Upload changed while the chunk was written')
+
+    return {'upload_id': upload_id, 'offset': offset + written, 'complete': offset + written == upload.total_size}
+
+
+@router.post('/uploads/{upload_id}/complete')
+async def complete_upload(upload_id: str, request: Request, db: Session = Depends(get_db)):
+    """Process a fully received upload. ZIPs are processed in the background from the spool file itself"""
+    upload = _get_upload(db, upload_id)
+    if upload.status == 'completed':
+        return _upload_out(upload)
+    if upload.status != 'open':
+        raise HTTPException(status_code=409, detail=f'Upload is {upload.status}')
+    if upload.received != upload.total_size:
+        raise _offset_conflict(upload, f'Upload incomplete, {upload.received} of {upload.total_size} bytes received')
+
+    claimed = (
+        db.query(UploadSession)
+        .filter(UploadSession.id == upload_id, UploadSession.status == 'open')
+        .update({'status': 'completed'}, synchronize_session=False)
+    )
+    db.commit()
+    db.refresh(upload)
+    if not claimed:
+        return _upload_out(upload)
+
+    spool_path = Path(upload.spool_path)
+    if upload.kind == 'zip':
+        try:
+            upload.task_id = SVGService.start_zip_processing(spool_path, upload.filename, client_key(request))
+        except QueueFullError:
+            # Keep the received bytes, completing again later resumes from here
+            upload.status = 'open'
+            db.commit()
+            raise
+        db.commit()
+        return {**_upload_out(upload), 'message': 'ZIP upload complete, processing in background'}
+
+    svg_file_id, filename, mode = upload.svg_file_id, upload.filename, upload.mode
+
+    def store_font():
+        font_db = SessionLocal()
+        try:
+            font_result = FontService.store_uploaded_font(font_db, svg_file_id, spool_path.read_bytes(), filename, mode)
+            SVGService.index_glyph_occurrences(font_db, svg_file_id, [font_result['font_id']])
+            SVGService.reindex_decoded_text(font_db, [svg_file_id])
+            return font_result
+        finally:
+            font_db.close()
+
+    # Font parsing and glyph extraction are CPU-bound, keep them off the event loop
+    try:
+        font_result = await run_in_threadpool(store_font)
+    except Exception as e:
+        logger.exception(f'Processing uploaded font {filename} failed')
+        # Reopened with its bytes kept, so the upload can be completed again or aborted
+        upload.status = 'open'
+        db.commit()
+        raise HTTPException(status_code=422, detail=f'Could not process font: {e}')
+
+    spool_path.unlink(missing_ok=True)
+    return {**_upload_out(upload), 'font': font_result}
+
+
+@router.delete('/uploads/{upload_id}')
+async def abort_upload(upload_id: str, db: Session = Depends(get_db)):
+    """Abandon an unfinished upload and free its spool file"""
+    upload = _get_upload(db, upload_id)
+    if upload.status != 'open':
+        raise HTTPException(status_code=409, detail=f'Upload is {upload.status}')
+
+    upload.status = 'aborted'
+    db.commit()
+    Path(upload.spool_path).unlink(missing_ok=True)
+    return _upload_out(upload)
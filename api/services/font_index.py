@@ -0,0 +1,107 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from metrics import record_cache
+from database.models import FontFile
+
+logger = logging.getLogger(__name__)
+
+FONT_MEDIA_TYPES = {
+    '.woff2': 'font/woff2',
+    '.woff': 'font/woff',
+    '.ttf': 'font/ttf',
+    '.otf': 'font/otf',
+}
+
+
+@dataclass(frozen=True)
+class FontFileEntry:
+    path: str
+    size: int
+    mtime: float
+    etag: str
+    media_type: str
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+
+def derive_etag(etag: str, suffix: str) -> str:
+    """Derive the ETag of an alternate representation (subset, gzip) of the same font version"""
+    return etag[:-1] + f'-{suffix}"'
+
+
+def media_type_for(filename: str) -> str:
+    return FONT_MEDIA_TYPES.get(Path(filename).suffix.lower(), 'application/octet-stream')
+
+
+class FontFileIndex:
+    """In-memory font_id -> file metadata index, so serving a font needs neither a DB query nor a stat"""
+
+    def __init__(self):
+        self._entries: Dict[int, FontFileEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_entry(path: str, filename: str) -> Optional[FontFileEntry]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        return FontFileEntry(
+            path=path, size=stat.st_size, mtime=stat.st_mtime, etag=etag, media_type=media_type_for(filename)
+        )
+
+    def register(self, font_id: int, path: str, filename: str) -> Optional[FontFileEntry]:
+        """Add or refresh a font in the index, called whenever a font file is written"""
+        entry = self._build_entry(path, filename)
+        with self._lock:
+            if entry:
+                self._entries[font_id] = entry
+            else:
+                self._entries.pop(font_id, None)
+        return entry
+
+    def discard(self, font_id: int):
+        with self._lock:
+            self._entries.pop(font_id, None)
+
+    def warm(self, db: Session) -> int:
+        """Populate the index from the database, returns the number of fonts indexed"""
+        rows = db.query(FontFile.id, FontFile.upload_path, FontFile.filename).all()
+        entries = {}
+        for font_id, path, filename in rows:
+            entry = self._build_entry(path, filename)
+            if entry:
+                entries[font_id] = entry
+
+        with self._lock:
+            self._entries.update(entries)
+
+        logger.info(f'Font index warmed with {len(entries)}/{len(rows)} fonts')
+        return len(entries)
+
+    def get(self, font_id: int, db: Session) -> Optional[FontFileEntry]:
+        entry = self._entries.get(font_id)
+        record_cache('font_index', entry is not None)
+        if entry:
+            return entry
+
+        # Miss: the font may have been ingested by another worker process
+        font_file = db.query(FontFile.upload_path, FontFile.filename).filter(FontFile.id == font_id).first()
+        if not font_file:
+            return None
+        return self.register(font_id, font_file.upload_path, font_file.filename)
+
+
+font_index = FontFileIndex()
@@ -1,106 +1,291 @@
 import os
 import uuid
+import importlib.util
 import base64
+import hashlib
 import shutil
+import logging
 import tempfile
 from io import BytesIO
 from pathlib import Path
+from sqlalchemy import case, func, insert
 from sqlalchemy.orm import Session
-from database.models import FontFile, Glyph
-from typing import List, Dict, Any, Optional
+from config import settings
+from metrics import errors, glyphs_processed, span
+from database.models import FontFile, Glyph, GlyphOccurrence
+from services.font_index import font_index
+from typing import List, Dict, Any, Iterator, Optional
 
-try:
-    from fontTools.ttLib import TTFont
+# fontTools and PIL are imported where they are used, so importing the API (and forking workers) stays cheap
+FONTTOOLS_AVAILABLE = importlib.util.find_spec('fontTools') is not None
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
 
-    FONTTOOLS_AVAILABLE = True
-except ImportError:
-    FONTTOOLS_AVAILABLE = False
+logger = logging.getLogger(__name__)
 
-try:
-    from PIL import Image, ImageDraw, ImageFont
+UPLOAD_DIR = Path('uploads')
+UPLOAD_SUBDIRS = ('fonts', 'pdf', 'spool')
 
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
 
-UPLOAD_DIR = Path('uploads')
-UPLOAD_DIR.mkdir(exist_ok=True)
-(UPLOAD_DIR / 'fonts').mkdir(exist_ok=True)
+def ensure_upload_dirs():
+    """Create the upload directories, once at startup rather than on import"""
+    for subdir in UPLOAD_SUBDIRS:
+        (UPLOAD_DIR / subdir).mkdir(parents=True, exist_ok=True)
 
 
 class FontService:
     @staticmethod
-    def generate_glyphs_from_font(db: Session, font_file_id: int, font_path: str):
-        """Extract glyphs from a font file and store them in the database"""
-        if not FONTTOOLS_AVAILABLE:
-            # print(f'Warning: fonttools not available, skipping glyph extraction for font {font_path}')
-            return
+    def _outline_hash(glyph_set, glyph_name: str) -> Optional[str]:
+        """Stable hash of a glyph's outline, used to recognise the same glyph under a different codepoint"""
+        from fontTools.pens.hashPointPen import HashPointPen
+        from fontTools.ttLib.tables._g_l_y_f import Glyph as GlyfGlyph
 
         try:
-            font = TTFont(font_path)
+            glyph = glyph_set[glyph_name]
+            pen = HashPointPen(glyph.width, glyph_set)
+
+            glyf_table = getattr(glyph_set, 'glyfTable', None)
+            compact = glyf_table.glyphs.get(glyph_name) if glyf_table is not None else None
+            if getattr(compact, 'data', None) and not glyph_set.location:
+                # Draw from a throwaway expanded copy, the table keeps every glyph it expands for the font's lifetime
+                transient = GlyfGlyph(compact.data)
+                transient.expand(glyf_table)
+                offset = glyph.lsb - transient.xMin if hasattr(transient, 'xMin') else 0
+                transient.drawPoints(pen, glyf_table, offset)
+            else:
+                glyph.drawPoints(pen)
+            return hashlib.blake2b(pen.hash.encode(), digest_size=16).hexdigest()
+        except Exception:
+            return None
+
+    @staticmethod
+    def _preview_image(display_text: str, codepoint: str) -> str:
+        svg_data = f"""<svg width="48" height="48" xmlns="http://www.w3.org/2000/svg">
+            <rect width="100%" height="100%" fill="#f8f9fa" stroke="#dee2e6"/>
+            <text x="24" y="24" text-anchor="middle" font-family="serif" font-size="14" fill="#212529">{display_text}</text>
+            <text x="24" y="42" text-anchor="middle" font-size="6" fill="#6c757d">{codepoint[:12]}</text>
+        </svg>"""
 
-            cmap = font.getBestCmap()
-            reverse_cmap = {glyph_name: unicode_val for unicode_val, glyph_name in cmap.items()}
+        preview_b64 = base64.b64encode(svg_data.encode()).decode()
+        return f'data:image/svg+xml;base64,{preview_b64}'
 
-            glyph_set = font.getGlyphSet()
-            all_glyph_names = list(glyph_set.keys())
+    @staticmethod
+    def glyph_key(glyph_name: str, reverse_cmap: Dict[str, int]) -> str:
+        """The Glyph.codepoint value for a glyph: its Unicode codepoint if cmap-mapped, else its bracketed name"""
+        if glyph_name in reverse_cmap:
+            return f'U+{reverse_cmap[glyph_name]:04X}'
+        return f'[{glyph_name}]'
+
+    @staticmethod
+    def iter_glyph_records(font) -> Iterator[Dict[str, Any]]:
+        """Yield codepoint, preview and outline hash for every glyph of an open TTFont (excluding .notdef).
 
-            # print(f'Processing font with {len(all_glyph_names)} total glyphs ({len(cmap)} Unicode-mapped)')
+        Glyphs are produced one at a time in glyph order, so with a lazily loaded font only the glyph being
+        processed needs to be decompiled. A glyph that fails to process is logged and skipped.
+        """
+        cmap = font.getBestCmap() or {}
+        reverse_cmap = {glyph_name: unicode_val for unicode_val, glyph_name in cmap.items()}
+        glyph_set = font.getGlyphSet()
 
-            glyph_count = 0
+        logger.debug(f'Processing font with {len(font.getGlyphOrder())} total glyphs ({len(cmap)} Unicode-mapped)')
 
-            for glyph_name in all_glyph_names:
-                if glyph_name == '.notdef':
-                    continue
+        for glyph_name in font.getGlyphOrder():
+            if glyph_name == '.notdef':
+                continue
 
+            try:
+                codepoint = FontService.glyph_key(glyph_name, reverse_cmap)
                 if glyph_name in reverse_cmap:
-                    unicode_val = reverse_cmap[glyph_name]
-                    try:
-                        character = chr(unicode_val)
-                        if unicode_val in [0, 0x0D, 0x0A]:
-                            continue
-                    except ValueError:
-                        character = f'[{glyph_name}]'
-                    codepoint = f'U+{unicode_val:04X}'
-                    display_text = character
+                    if reverse_cmap[glyph_name] in [0, 0x0D, 0x0A]:
+                        continue
+                    display_text = chr(reverse_cmap[glyph_name])
                 else:
-                    character = f'[{glyph_name}]'
-                    codepoint = f'[{glyph_name}]'
                     display_text = glyph_name[:8]
 
                 if len(display_text) > 8:
                     display_text = display_text[:6] + '...'
 
-                svg_data = f"""<svg width="48" height="48" xmlns="http://www.w3.org/2000/svg">
-                    <rect width="100%" height="100%" fill="#f8f9fa" stroke="#dee2e6"/>
-                    <text x="24" y="24" text-anchor="middle" font-family="serif" font-size="14" fill="#212529">{display_text}</text>
-                    <text x="24" y="42" text-anchor="middle" font-size="6" fill="#6c757d">{codepoint[:12]}</text>
-                </svg>"""
-
-                preview_b64 = base64.b64encode(svg_data.encode()).decode()
-
-                glyph = Glyph(
-                    font_file_id=font_file_id,
-                    codepoint=codepoint,
-                    preview_image=f'data:image/svg+xml;base64,{preview_b64}',
-                    mapping='',
-                    is_mapped=False,
-                    rendered_preview=None,  # Will be generated on-demand
-                )
+                yield {
+                    'codepoint': codepoint,
+                    'preview_image': FontService._preview_image(display_text, codepoint),
+                    'outline_hash': FontService._outline_hash(glyph_set, glyph_name),
+                }
+            except Exception as e:
+                errors.inc(component='glyph_extract')
+                logger.warning(f'Skipping glyph {glyph_name}: {e}')
+
+    @staticmethod
+    def _insert_glyph_chunk(db: Session, rows: List[Dict[str, Any]]) -> int:
+        """Insert and commit one chunk of glyph rows. Returns the number inserted, 0 if the chunk failed"""
+        try:
+            with span('db_commit'):
+                db.execute(insert(Glyph), rows)
+                db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            errors.inc(component='glyph_extract')
+            logger.exception(f'Failed to insert chunk of {len(rows)} glyphs starting at {rows[0]["codepoint"]}')
+            return 0
 
-                db.add(glyph)
-                glyph_count += 1
+    @staticmethod
+    def generate_glyphs_from_font(db: Session, font_file_id: int, font_path: str):
+        """Extract glyphs from a font file and store them in the database.
 
-            # print(f'Extracted {glyph_count} glyphs from font (excluding .notdef)')
+        Glyph rows are streamed into the database in chunks of GLYPH_CHUNK_SIZE, each committed on its own, so
+        memory stays flat regardless of font size and a failing chunk does not discard the rest of the font.
+        """
+        if not FONTTOOLS_AVAILABLE:
+            logger.warning(f'fonttools not available, skipping glyph extraction for font {font_path}')
+            return
 
+        try:
+            from fontTools.ttLib import TTFont
+
+            with span('font_parse'):
+                font = TTFont(font_path, lazy=True)
+        except Exception:
+            errors.inc(component='font_parse')
+            logger.exception(f'Error processing font {font_path}')
+            return
+
+        glyph_count = 0
+        chunk = []
+        try:
+            with span('glyph_extract'):
+                for record in FontService.iter_glyph_records(font):
+                    chunk.append(
+                        {
+                            'font_file_id': font_file_id,
+                            'mapping': '',
+                            'is_mapped': False,
+                            'is_retired': False,
+                            'rendered_preview': None,  # Will be generated on-demand
+                            **record,
+                        }
+                    )
+                    if len(chunk) >= settings.GLYPH_CHUNK_SIZE:
+                        glyph_count += FontService._insert_glyph_chunk(db, chunk)
+                        chunk = []
+
+                if chunk:
+                    glyph_count += FontService._insert_glyph_chunk(db, chunk)
+        except Exception:
+            errors.inc(component='glyph_extract')
+            logger.exception(f'Error processing font {font_path}')
+        finally:
             font.close()
-            db.commit()
 
-        except Exception as e:
-            # print(f'Error processing font {font_path}: {e}')
-            import traceback
+        logger.debug(f'Extracted {glyph_count} glyphs from font (excluding .notdef)')
+        glyphs_processed.inc(glyph_count, operation='extract')
+
+    @staticmethod
+    def update_font_incremental(db: Session, font_file: FontFile, file_content: bytes, filename: str) -> Dict[str, Any]:
+        """Replace a font with a new version, keeping existing glyph rows and their mappings.
+
+        New glyphs are matched to existing rows by codepoint first and by outline hash second, so a glyph that
+        moved to another codepoint keeps its mapping. A glyph whose outline changed to one no mapped glyph had loses
+        its mapping. Glyphs missing from the new version are retired rather than deleted. Everything happens in a
+        single transaction.
+        """
+        if not FONTTOOLS_AVAILABLE:
+            raise RuntimeError('fonttools is required for incremental font updates')
+
+        file_id = str(uuid.uuid4())
+        file_path = UPLOAD_DIR / 'fonts' / f'{file_id}_{filename}'
+        with open(file_path, 'wb') as f:
+            f.write(file_content)
+
+        old_path = font_file.upload_path
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'carried': 0, 'cleared': 0, 'retired': 0}
+
+        try:
+            from fontTools.ttLib import TTFont
+
+            with span('font_parse'):
+                font = TTFont(str(file_path), lazy=True)
+
+            existing = db.query(Glyph).filter(Glyph.font_file_id == font_file.id).all()
+            by_codepoint = {glyph.codepoint: glyph for glyph in existing}
+            # Snapshot of mappings by outline, taken before any row is modified
+            mapped_by_hash = {}
+            for glyph in existing:
+                if glyph.outline_hash and glyph.is_mapped:
+                    mapped_by_hash.setdefault(glyph.outline_hash, glyph.mapping)
+
+            seen = set()
+            with span('glyph_diff'):
+                for record in FontService.iter_glyph_records(font):
+                    codepoint = record['codepoint']
+                    seen.add(codepoint)
+                    glyph = by_codepoint.get(codepoint)
+                    # A mapped glyph with this outline existed before, possibly under another codepoint
+                    carried_mapping = mapped_by_hash.get(record['outline_hash']) if record['outline_hash'] else None
+
+                    if glyph:
+                        if glyph.outline_hash is None:
+                            # Stored before outline hashes existed: nothing to compare, keep the row and its previews
+                            glyph.outline_hash = record['outline_hash']
+                            outline_changed = False
+                        else:
+                            outline_changed = glyph.outline_hash != record['outline_hash']
+                        if outline_changed or glyph.is_retired:
+                            glyph.outline_hash = record['outline_hash']
+                            glyph.preview_image = record['preview_image']
+                            glyph.rendered_preview = None
+                            glyph.is_retired = False
+                            stats['updated'] += 1
+                            if outline_changed and carried_mapping is not None and carried_mapping != glyph.mapping:
+                                glyph.mapping = carried_mapping
+                                glyph.is_mapped = True
+                                stats['carried'] += 1
+                            elif outline_changed and carried_mapping is None and glyph.is_mapped:
+                                # A new outline is a different character in an obfuscated font, the old mapping
+                                # would now be wrong; the glyph goes back to the unmapped ones for review
+                                glyph.mapping = ''
+                                glyph.is_mapped = False
+                                stats['cleared'] += 1
+                        else:
+                            stats['unchanged'] += 1
+                        continue
+
+                    db.add(
+                        Glyph(
+                            font_file_id=font_file.id,
+                            mapping=carried_mapping or '',
+                            is_mapped=carried_mapping is not None,
+                            rendered_preview=None,
+                            **record,
+                        )
+                    )
+                    stats['inserted'] += 1
+                    if carried_mapping is not None:
+                        stats['carried'] += 1
+
+            font.close()
+
+            for glyph in existing:
+                if glyph.codepoint not in seen and not glyph.is_retired:
+                    glyph.is_retired = True
+                    stats['retired'] += 1
 
-            traceback.print_exc()
+            font_file.filename = filename
+            font_file.upload_path = str(file_path)
+
+            with span('db_commit'):
+                db.commit()
+        except Exception:
+            db.rollback()
+            file_path.unlink(missing_ok=True)
+            errors.inc(component='glyph_diff')
+            raise
+
+        font_index.register(font_file.id, str(file_path), filename)
+        if old_path and old_path != str(file_path):
+            Path(old_path).unlink(missing_ok=True)
+
+        glyphs_processed.inc(stats['inserted'] + stats['updated'], operation='incremental')
+        logger.info(f'Incrementally updated font {font_file.id}: {stats}')
+        return {'font_id': font_file.id, 'font_name': font_file.font_name, 'filename': filename, **stats}
 
     @staticmethod
     def generate_png_previews_for_font(db: Session, font_file_id: int, progress_callback=None) -> Dict[str, Any]:
@@ -114,7 +299,8 @@ class FontService:
         # Get all glyphs for this font that don't have rendered previews
         glyphs = db.query(Glyph).filter(
             Glyph.font_file_id == font_file_id,
-            Glyph.rendered_preview.is_(None)
+            Glyph.rendered_preview.is_(None),
+            Glyph.is_retired == False
         ).all()
         
         if not glyphs:
@@ -125,28 +311,32 @@ class FontService:
         error_count = 0
         total_glyphs = len(glyphs)
         
-        for i, glyph in enumerate(glyphs):
-            try:
-                # Generate PNG preview
-                rendered_preview_b64 = FontService.generate_png_for_glyph(glyph, font_path)
-                if rendered_preview_b64:
-                    glyph.rendered_preview = rendered_preview_b64
-                    processed_count += 1
-                else:
+        with span('png_render'):
+            for i, glyph in enumerate(glyphs):
+                try:
+                    # Generate PNG preview
+                    rendered_preview_b64 = FontService.generate_png_for_glyph(glyph, font_path)
+                    if rendered_preview_b64:
+                        glyph.rendered_preview = rendered_preview_b64
+                        processed_count += 1
+                    else:
+                        error_count += 1
+
+                    # Update progress if callback provided
+                    if progress_callback:
+                        progress = int(((i + 1) / total_glyphs) * 100)
+                        progress_callback(progress, f'Processing glyph {i + 1}/{total_glyphs}')
+
+                except Exception as e:
                     error_count += 1
-                    
-                # Update progress if callback provided
-                if progress_callback:
-                    progress = int(((i + 1) / total_glyphs) * 100)
-                    progress_callback(progress, f'Processing glyph {i + 1}/{total_glyphs}')
-                    
-            except Exception as e:
-                error_count += 1
-                print(f'Error generating PNG for glyph {glyph.codepoint}: {e}')
-        
+                    logger.warning(f'Error generating PNG for glyph {glyph.codepoint}: {e}')
+
         # Commit all changes
-        db.commit()
-        
+        with span('db_commit'):
+            db.commit()
+        glyphs_processed.inc(processed_count, operation='render')
+        errors.inc(error_count, component='png_render')
+
         return {
             'success': True,
             'processed': processed_count,
@@ -180,6 +370,8 @@ class FontService:
             working_font_path = temp_font_path
 
         try:
+            from PIL import Image, ImageDraw, ImageFont
+
             img = Image.new('RGB', (128, 128), 'white')
             draw = ImageDraw.Draw(img)
 
@@ -215,6 +407,8 @@ class FontService:
             return None
 
         try:
+            from fontTools.ttLib import TTFont
+
             temp_fd, temp_path = tempfile.mkstemp(suffix='.ttf')
             os.close(temp_fd)
 
@@ -224,6 +418,116 @@ class FontService:
         except Exception:
             return None
 
+    @staticmethod
+    def get_mapping_progress(
+        db: Session, svg_file_ids: Optional[List[int]] = None, pdf_file_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """font_file_id -> svg_file_id, names, mapped and total glyph counts, from one grouped aggregate"""
+        query = (
+            db.query(
+                FontFile.id,
+                FontFile.svg_file_id,
+                FontFile.font_name,
+                FontFile.filename,
+                func.count(Glyph.id),
+                func.coalesce(func.sum(case((Glyph.is_mapped == True, 1), else_=0)), 0),
+            )
+            .outerjoin(Glyph, (Glyph.font_file_id == FontFile.id) & (Glyph.is_retired == False))
+            .group_by(FontFile.id)
+        )
+        if svg_file_ids is not None:
+            query = query.filter(FontFile.svg_file_id.in_(svg_file_ids))
+        if pdf_file_id is not None:
+            query = query.filter(FontFile.pdf_file_id == pdf_file_id)
+
+        return {
+            font_id: {
+                'svg_file_id': svg_file_id,
+                'font_name': font_name,
+                'filename': filename,
+                'mapped': int(mapped),
+                'total': total,
+            }
+            for font_id, svg_file_id, font_name, filename, total, mapped in query
+        }
+
+    @staticmethod
+    def get_glyph_usage(db: Session, font_file_id: int) -> Dict[int, int]:
+        """glyph_id -> total occurrences across indexed SVGs and PDFs, for glyphs that occur at all"""
+        return FontService.get_glyph_usage_for_fonts(db, [font_file_id])
+
+    @staticmethod
+    def get_glyph_usage_for_fonts(db: Session, font_file_ids: List[int]) -> Dict[int, int]:
+        """get_glyph_usage for several fonts at once, from one grouped query"""
+        if not font_file_ids:
+            return {}
+        rows = (
+            db.query(GlyphOccurrence.glyph_id, func.sum(GlyphOccurrence.count))
+            .join(Glyph, Glyph.id == GlyphOccurrence.glyph_id)
+            .filter(Glyph.font_file_id.in_(font_file_ids))
+            .group_by(GlyphOccurrence.glyph_id)
+            .all()
+        )
+        return {glyph_id: int(total) for glyph_id, total in rows}
+
+    @staticmethod
+    def get_affected_documents(db: Session, glyph_id: int) -> Dict[str, List[int]]:
+        """SVGs and PDFs whose decoded text changes when this glyph's mapping does"""
+        rows = db.query(GlyphOccurrence.svg_file_id, GlyphOccurrence.pdf_file_id).filter(
+            GlyphOccurrence.glyph_id == glyph_id, GlyphOccurrence.count > 0
+        )
+        svg_file_ids, pdf_file_ids = set(), set()
+        for svg_file_id, pdf_file_id in rows:
+            if svg_file_id:
+                svg_file_ids.add(svg_file_id)
+            if pdf_file_id:
+                pdf_file_ids.add(pdf_file_id)
+        return {'svg_file_ids': sorted(svg_file_ids), 'pdf_file_ids': sorted(pdf_file_ids)}
+
+    @staticmethod
+    def get_translation_table(db: Session, font_file_id: int) -> Dict[int, str]:
+        """str.translate table from encoded character to mapped text for a font's mapped glyphs"""
+        rows = (
+            db.query(Glyph.codepoint, Glyph.mapping)
+            .filter(
+                Glyph.font_file_id == font_file_id,
+                Glyph.is_mapped == True,
+                Glyph.is_retired == False,
+                Glyph.codepoint.startswith('U+'),
+            )
+            .all()
+        )
+
+        table = {}
+        for codepoint, mapping in rows:
+            try:
+                table[int(codepoint[2:], 16)] = mapping
+            except ValueError:
+                continue
+        return table
+
+    @staticmethod
+    def apply_mapping_set(db: Session, font_file_id: int, mappings: Dict[str, str]) -> int:
+        """Copy codepoint -> mapping pairs onto a font's unmapped glyphs. Returns the number of glyphs updated"""
+        if not mappings:
+            return 0
+
+        glyphs = (
+            db.query(Glyph)
+            .filter(Glyph.font_file_id == font_file_id, Glyph.is_mapped == False, Glyph.is_retired == False)
+            .all()
+        )
+        updated = 0
+        for glyph in glyphs:
+            mapping = mappings.get(glyph.codepoint)
+            if mapping and mapping.strip():
+                glyph.mapping = mapping
+                glyph.is_mapped = True
+                updated += 1
+
+        db.commit()
+        return updated
+
     @staticmethod
     def match_fonts_to_svg(required_fonts: List[str], available_fonts: List[Path]) -> List[Path]:
         """Match required fonts to available font files"""
@@ -245,6 +549,21 @@ class FontService:
 
         return matched_fonts
 
+    @staticmethod
+    def store_uploaded_font(db: Session, svg_file_id: int, content: bytes, filename: str, mode: str) -> Dict[str, Any]:
+        """Attach an uploaded font to an SVG. With mode 'update' a font of the same name is replaced in place"""
+        existing_font = None
+        if mode == 'update':
+            existing_font = (
+                db.query(FontFile)
+                .filter(FontFile.svg_file_id == svg_file_id, FontFile.font_name == Path(filename).stem)
+                .first()
+            )
+
+        if existing_font:
+            return FontService.update_font_incremental(db, existing_font, content, filename)
+        return FontService.save_font_file(content, filename, svg_file_id, db)
+
     @staticmethod
     def save_font_file(file_content: bytes, filename: str, svg_file_id: int, db: Session) -> Dict[str, Any]:
         """Save uploaded font file and process glyphs"""
@@ -264,6 +583,7 @@ class FontService:
         )
         db.add(db_font)
         db.commit()
+        font_index.register(db_font.id, str(file_path), filename)
 
         FontService.generate_glyphs_from_font(db, db_font.id, str(file_path))
 
@@ -288,6 +608,7 @@ class FontService:
         )
         db.add(db_font)
         db.commit()
+        font_index.register(db_font.id, str(final_font_path), font_file.name)
 
         FontService.generate_glyphs_from_font(db, db_font.id, str(final_font_path))
 
@@ -302,13 +623,13 @@ class FontService:
             return None
             
         if not png_base64.startswith('data:image/png;base64,'):
-            print(f'Warning: Invalid PNG format - does not start with data:image/png;base64,')
+            logger.warning('Invalid PNG format - does not start with data:image/png;base64,')
             return None
 
         # Check for API key
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
-            print('Warning: GEMINI_API_KEY not found')
+            logger.warning('GEMINI_API_KEY not found')
             return None
 
         try:
@@ -323,13 +644,14 @@ class FontService:
             image_bytes = base64.b64decode(image_data)
             image = Image.open(io.BytesIO(image_bytes)) 
             
-            response = client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=[
-                    "What single character is shown in this image? Reply with only the character, no explanation.",
-                    image
-                ]
-            )
+            with span('ai_request'):
+                response = client.models.generate_content(
+                    model="gemini-1.5-flash",
+                    contents=[
+                        "What single character is shown in this image? Reply with only the character, no explanation.",
+                        image
+                    ]
+                )
 
             if not response.text:
                 return None
@@ -350,8 +672,9 @@ class FontService:
             return None
 
         except ImportError:
-            print('Warning: google-generativeai library not installed. Run: pip install google-generativeai')
+            logger.warning('google-genai library not installed. Run: pip install google-genai')
             return None
         except Exception as e:
-            print(f'Gemini AI suggestion failed: {e}')
+            errors.inc(component='ai_request')
+            logger.warning(f'Gemini AI suggestion failed: {e}')
             return None
\ No newline at end of file
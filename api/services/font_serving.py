@@ -0,0 +1,200 @@
+import os
+import gzip
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from config import settings
+from metrics import record_cache
+from services.font_index import FontFileEntry, derive_etag
+
+logger = logging.getLogger(__name__)
+
+# Formats that are not already compressed and benefit from a gzip sidecar
+COMPRESSIBLE_SUFFIXES = ('.ttf', '.otf')
+
+BASE_HEADERS = {'Access-Control-Allow-Origin': '*', 'Cache-Control': 'public, max-age=31536000'}
+
+# (font_id, etag, text) -> (subset bytes, subset etag)
+_subset_cache: OrderedDict[Tuple[int, str, str], Tuple[bytes, str]] = OrderedDict()
+_subset_lock = threading.Lock()
+
+
+class FontServing:
+    @staticmethod
+    def is_not_modified(request: Request, etags: Tuple[str, ...], mtime: Optional[float]) -> bool:
+        """Evaluate If-None-Match / If-Modified-Since against the current representation(s)"""
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in candidates or not candidates.isdisjoint(etags)
+
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since and mtime is not None:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+    @staticmethod
+    def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+        """Parse a single byte range, returns inclusive (start, end) or None if unsatisfiable.
+
+        Multi-range requests are collapsed to their first range; browsers never send them for fonts.
+        """
+        unit, _, ranges = range_header.partition('=')
+        if unit.strip().lower() != 'bytes' or not ranges:
+            return None
+
+        first = ranges.split(',')[0].strip()
+        start_str, _, end_str = first.partition('-')
+        try:
+            if start_str:
+                start = int(start_str)
+                end = int(end_str) if end_str else size - 1
+            else:
+                # Suffix range: last N bytes
+                length = int(end_str)
+                if length <= 0:
+                    return None
+                start = max(size - length, 0)
+                end = size - 1
+        except ValueError:
+            return None
+
+        end = min(end, size - 1)
+        if start > end or start >= size:
+            return None
+        return start, end
+
+    @staticmethod
+    def _gzip_sidecar(entry: FontFileEntry) -> Optional[str]:
+        """Return path to a precompressed copy of the font, creating it on first use"""
+        gz_path = f'{entry.path}.gz'
+        try:
+            if os.stat(gz_path).st_mtime >= entry.mtime:
+                return gz_path
+        except OSError:
+            pass
+
+        tmp_path = f'{gz_path}.{os.getpid()}.tmp'
+        try:
+            with open(entry.path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=9) as dst:
+                dst.write(src.read())
+            os.replace(tmp_path, gz_path)
+            return gz_path
+        except OSError as e:
+            logger.warning(f'Could not precompress {entry.path}: {e}')
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+
+    @staticmethod
+    def _subset(font_id: int, entry: FontFileEntry, text: str) -> Optional[Tuple[bytes, str]]:
+        """Subset the font to the glyphs needed for `text`, cached per font version"""
+        key = (font_id, entry.etag, ''.join(sorted(set(text))))
+        with _subset_lock:
+            cached = _subset_cache.get(key)
+            if cached:
+                _subset_cache.move_to_end(key)
+        record_cache('font_subset', cached is not None)
+        if cached:
+            return cached
+
+        try:
+            from fontTools import subset
+            from fontTools.ttLib import TTFont
+        except ImportError:
+            return None
+
+        try:
+            options = subset.Options()
+            options.flavor = 'woff'
+            options.notdef_outline = True
+            options.layout_features = ['*']
+
+            font = TTFont(entry.path)
+            subsetter = subset.Subsetter(options=options)
+            subsetter.populate(text=key[2])
+            subsetter.subset(font)
+
+            buffer = BytesIO()
+            font.flavor = 'woff'
+            font.save(buffer)
+            font.close()
+        except Exception as e:
+            logger.warning(f'Subsetting font {font_id} failed, serving full file: {e}')
+            return None
+
+        data = buffer.getvalue()
+        digest = hashlib.blake2b(key[2].encode(), digest_size=8).hexdigest()
+        result = (data, derive_etag(entry.etag, f's{digest}'))
+
+        with _subset_lock:
+            _subset_cache[key] = result
+            while len(_subset_cache) > settings.FONT_SUBSET_CACHE_SIZE:
+                _subset_cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def build_response(request: Request, font_id: int, entry: FontFileEntry, text: Optional[str] = None) -> Response:
+        """Build the response for a font request honouring conditional, Range and subset requests.
+
+        Raises FileNotFoundError when the indexed file is gone. FileResponse only looks at the file once it is sent,
+        too late to answer 404. Subsetting and sidecar compression block, so call this from a worker thread.
+        """
+        os.stat(entry.path)
+
+        if text:
+            subset_result = FontServing._subset(font_id, entry, text)
+            if subset_result:
+                data, etag = subset_result
+                headers = {**BASE_HEADERS, 'ETag': etag}
+                if FontServing.is_not_modified(request, (etag,), None):
+                    return Response(status_code=304, headers=headers)
+                return Response(content=data, media_type='font/woff', headers=headers)
+
+        headers = {
+            **BASE_HEADERS,
+            'ETag': entry.etag,
+            'Last-Modified': entry.last_modified,
+            'Accept-Ranges': 'bytes',
+        }
+
+        if FontServing.is_not_modified(request, (entry.etag, derive_etag(entry.etag, 'gz')), entry.mtime):
+            return Response(status_code=304, headers=headers)
+
+        range_header = request.headers.get('range')
+        if_range = request.headers.get('if-range')
+        if range_header and (if_range is None or if_range in (entry.etag, entry.last_modified)):
+            byte_range = FontServing.parse_range(range_header, entry.size)
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{entry.size}'})
+
+            start, end = byte_range
+            with open(entry.path, 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+            headers['Content-Range'] = f'bytes {start}-{end}/{entry.size}'
+            return Response(content=data, status_code=206, media_type=entry.media_type, headers=headers)
+
+        path = entry.path
+        if entry.path.lower().endswith(COMPRESSIBLE_SUFFIXES) and 'gzip' in request.headers.get('accept-encoding', ''):
+            gz_path = FontServing._gzip_sidecar(entry)
+            if gz_path:
+                path = gz_path
+                headers['Content-Encoding'] = 'gzip'
+                headers['Vary'] = 'Accept-Encoding'
+                headers['ETag'] = derive_etag(entry.etag, 'gz')
+                headers.pop('Accept-Ranges')
+
+        return FileResponse(path=path, media_type=entry.media_type, headers=headers)
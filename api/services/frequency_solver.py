@@ -0,0 +1,433 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import span
+from database.models import FontFile, Glyph, PDFTextRun
+from services.svg_service import SVGService
+from services.svg_storage import svg_storage
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Add-k smoothing of corpus bigram counts, keeps unseen pairs possible but unlikely
+BIGRAM_SMOOTHING = 0.1
+MAX_SWEEPS = 25
+# Candidate characters tried per glyph and sweep, taken from the marginal score ranking
+MOVE_CANDIDATES = 6
+SVG_BATCH_SIZE = 50
+
+
+def _codepoints(text: str) -> 'np.ndarray':
+    return np.frombuffer(text.encode('utf-32-le', errors='surrogatepass'), dtype='<u4').astype(np.int64)
+
+
+@dataclass
+class LanguageModel:
+    """Character bigram model; index len(chars) is the boundary between lines and text runs"""
+
+    chars: List[str]
+    codepoints: 'np.ndarray'
+    unigram: 'np.ndarray'
+    log_bigram: 'np.ndarray'
+
+    @property
+    def boundary(self) -> int:
+        return len(self.chars)
+
+    def index_of(self, char: str) -> int:
+        position = np.searchsorted(self.codepoints, ord(char))
+        if position < len(self.codepoints) and self.codepoints[position] == ord(char):
+            return int(position)
+        return self.boundary
+
+    def lookup(self, codepoints: 'np.ndarray') -> 'np.ndarray':
+        """LM index per codepoint, boundary for characters outside the alphabet"""
+        if not len(self.codepoints):
+            return np.full(len(codepoints), self.boundary)
+        positions = np.searchsorted(self.codepoints, codepoints).clip(max=len(self.codepoints) - 1)
+        return np.where(self.codepoints[positions] == codepoints, positions, self.boundary)
+
+
+@dataclass
+class CipherStats:
+    """Sparse bigram counts over symbols: font glyphs, plaintext characters passed through, and the boundary"""
+
+    glyph_count: int
+    rows: 'np.ndarray'
+    cols: 'np.ndarray'
+    counts: 'np.ndarray'
+    occurrences: 'np.ndarray'
+
+
+_language_models: Dict[Tuple[str, float, int], LanguageModel] = {}
+_language_model_lock = threading.Lock()
+
+
+class FrequencySolver:
+    """Propose mappings for unmapped glyphs by solving the font's encoding as a substitution cipher.
+
+    Glyph bigram counts are gathered from every SVG and PDF using the font family, and assignments of glyphs to
+    characters are scored against a character bigram model of a local corpus. Confirmed mappings stay fixed.
+    """
+
+    @staticmethod
+    def _corpus_files(path: Path) -> List[Path]:
+        if path.is_dir():
+            return sorted(p for p in path.rglob('*.txt') if p.is_file())
+        return [path]
+
+    @staticmethod
+    def _corpus_tokens(text: str, model_codepoints: 'np.ndarray', boundary: int) -> 'np.ndarray':
+        codepoints = _codepoints(text)
+        positions = np.searchsorted(model_codepoints, codepoints).clip(max=len(model_codepoints) - 1)
+        return np.where(model_codepoints[positions] == codepoints, positions, boundary)
+
+    @staticmethod
+    def build_language_model(corpus_path: str, alphabet_size: int) -> LanguageModel:
+        """Count corpus characters, keep the most frequent as the alphabet, then count bigrams over it"""
+        files = FrequencySolver._corpus_files(Path(corpus_path))
+        if not files:
+            raise FileNotFoundError(f'No corpus text found at {corpus_path}')
+
+        character_counts = np.zeros(0x110000, dtype=np.int64)
+        for file in files:
+            character_counts += np.bincount(_codepoints(file.read_text(encoding='utf-8')), minlength=0x110000)
+
+        # Line breaks and other whitespace except the plain space act as boundaries
+        for codepoint in range(0x21):
+            if codepoint != 0x20:
+                character_counts[codepoint] = 0
+        alphabet = np.argsort(-character_counts, kind='stable')[:alphabet_size]
+        alphabet = np.sort(alphabet[character_counts[alphabet] > 0])
+
+        size = len(alphabet) + 1
+        bigram_counts = np.zeros(size * size, dtype=np.float64)
+        for file in files:
+            tokens = FrequencySolver._corpus_tokens(file.read_text(encoding='utf-8'), alphabet, len(alphabet))
+            tokens = np.concatenate(([len(alphabet)], tokens, [len(alphabet)]))
+            bigram_counts += np.bincount(tokens[:-1] * size + tokens[1:], minlength=size * size)
+
+        bigram_counts = bigram_counts.reshape(size, size) + BIGRAM_SMOOTHING
+        log_bigram = np.log(bigram_counts / bigram_counts.sum(axis=1, keepdims=True))
+
+        unigram = np.append(character_counts[alphabet], 0).astype(np.float64)
+        return LanguageModel(
+            chars=[chr(codepoint) for codepoint in alphabet],
+            codepoints=alphabet.astype(np.int64),
+            unigram=unigram,
+            log_bigram=log_bigram,
+        )
+
+    @staticmethod
+    def language_model() -> LanguageModel:
+        """Language model of SOLVER_CORPUS_PATH, rebuilt when the corpus changes"""
+        path = Path(settings.SOLVER_CORPUS_PATH)
+        files = FrequencySolver._corpus_files(path) if path.exists() else []
+        mtime = max((file.stat().st_mtime for file in files), default=0)
+        key = (str(path), mtime, settings.SOLVER_ALPHABET_SIZE)
+
+        with _language_model_lock:
+            if key not in _language_models:
+                with span('language_model_build'):
+                    _language_models.clear()
+                    _language_models[key] = FrequencySolver.build_language_model(
+                        str(path), settings.SOLVER_ALPHABET_SIZE
+                    )
+            return _language_models[key]
+
+    @staticmethod
+    def is_available() -> bool:
+        if not (NUMPY_AVAILABLE and settings.SOLVER_CORPUS_PATH):
+            return False
+        path = Path(settings.SOLVER_CORPUS_PATH)
+        # A directory without any .txt file has no corpus to build a language model from
+        return path.exists() and bool(FrequencySolver._corpus_files(path))
+
+    @staticmethod
+    def _iter_font_runs(db: Session, family_fonts: List[FontFile]) -> Iterator[Tuple[str, Any]]:
+        """Yield ('text', str) for SVG text runs and ('keys', list) for PDF runs set in the font family"""
+        font_name = family_fonts[0].font_name
+        svg_ids = sorted({font.svg_file_id for font in family_fonts if font.svg_file_id})
+
+        for start in range(0, len(svg_ids), SVG_BATCH_SIZE):
+            batch = svg_ids[start : start + SVG_BATCH_SIZE]
+            fonts_by_svg: Dict[int, List[Tuple[str, str]]] = {}
+            for svg_file_id, name, filename in (
+                db.query(FontFile.svg_file_id, FontFile.font_name, FontFile.filename)
+                .filter(FontFile.svg_file_id.in_(batch))
+                .order_by(FontFile.id)
+            ):
+                fonts_by_svg.setdefault(svg_file_id, []).append((name, filename))
+
+            for svg_file_id, content in svg_storage.iter_contents(db, batch):
+                font_keys = fonts_by_svg.get(svg_file_id, [])
+                matches: Dict[Optional[str], bool] = {}
+                for family, text in SVGService.iter_text_runs(content):
+                    if family not in matches:
+                        index = SVGService.match_font_for_family(family, font_keys) if family else None
+                        matches[family] = index is not None and font_keys[index][0] == font_name
+                    if matches[family]:
+                        yield 'text', text
+
+        font_ids = [font.id for font in family_fonts]
+        for (glyph_keys,) in db.query(PDFTextRun.glyph_keys).filter(PDFTextRun.font_file_id.in_(font_ids)):
+            yield 'keys', json.loads(glyph_keys)
+
+    @staticmethod
+    def collect_stats(db: Session, family_fonts: List[FontFile], keys: List[str], model: LanguageModel) -> CipherStats:
+        """Glyph unigram and bigram counts over all text set in the font family"""
+        glyph_count = len(keys)
+        boundary = glyph_count + model.boundary
+        size = boundary + 1
+        symbol_of_key = {key: index for index, key in enumerate(keys)}
+
+        codepoint_keys = sorted((int(key[2:], 16), index) for index, key in enumerate(keys) if key.startswith('U+'))
+        glyph_codepoints = np.array([codepoint for codepoint, _ in codepoint_keys] or [-1], dtype=np.int64)
+        glyph_symbols = np.array([index for _, index in codepoint_keys] or [boundary], dtype=np.int64)
+
+        def text_symbols(text: str) -> 'np.ndarray':
+            codepoints = _codepoints(text)
+            positions = np.searchsorted(glyph_codepoints, codepoints).clip(max=len(glyph_codepoints) - 1)
+            is_glyph = glyph_codepoints[positions] == codepoints
+            # Characters the font does not encode are plain text and keep their meaning
+            return np.where(is_glyph, glyph_symbols[positions], glyph_count + model.lookup(codepoints))
+
+        pair_codes, pair_counts, batch = [], [], []
+        occurrences = np.zeros(size, dtype=np.float64)
+
+        def flush():
+            tokens = np.concatenate(batch + [np.array([boundary])])
+            batch.clear()
+            np.add.at(occurrences, tokens, 1)
+            codes = tokens[:-1] * size + tokens[1:]
+            codes = codes[codes != boundary * size + boundary]
+            unique, counts = np.unique(codes, return_counts=True)
+            pair_codes.append(unique)
+            pair_counts.append(counts)
+
+        batched = 0
+        for kind, run in FrequencySolver._iter_font_runs(db, family_fonts):
+            if kind == 'text':
+                symbols = text_symbols(run)
+            else:
+                symbols = np.array([symbol_of_key.get(key, boundary) for key in run], dtype=np.int64)
+            batch.append(np.array([boundary]))
+            batch.append(symbols)
+            batched += len(symbols)
+            if batched >= 1_000_000:
+                flush()
+                batched = 0
+        if batch:
+            flush()
+
+        if pair_codes:
+            codes, inverse = np.unique(np.concatenate(pair_codes), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate(pair_counts))
+        else:
+            codes, counts = np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        occurrences[boundary] = 0
+        return CipherStats(
+            glyph_count=glyph_count,
+            rows=codes // size,
+            cols=codes % size,
+            counts=counts,
+            occurrences=occurrences,
+        )
+
+    @staticmethod
+    def solve(
+        stats: CipherStats, model: LanguageModel, fixed: Dict[int, str], top_k: int = 3
+    ) -> Dict[int, Dict[str, Any]]:
+        """Assign characters to free glyph symbols by coordinate ascent with swaps. Returns symbol -> proposal"""
+        glyph_count = stats.glyph_count
+        boundary = model.boundary
+        size = glyph_count + boundary + 1
+        log_bigram = model.log_bigram
+
+        # Character a symbol contributes as right member (first char) and left member (last char) of a bigram
+        first = np.empty(size, dtype=np.int64)
+        last = np.empty(size, dtype=np.int64)
+        first[glyph_count:] = last[glyph_count:] = np.arange(boundary + 1)
+
+        free = [
+            symbol
+            for symbol in np.argsort(-stats.occurrences[:glyph_count], kind='stable')
+            if symbol not in fixed and stats.occurrences[symbol] > 0
+        ]
+        for symbol, mapping in fixed.items():
+            first[symbol] = model.index_of(mapping[0])
+            last[symbol] = model.index_of(mapping[-1])
+
+        # Under a one-to-one encoding, characters confirmed for other glyphs are not candidates
+        allowed = np.ones(boundary + 1, dtype=bool)
+        allowed[boundary] = False
+        # Characters that appear unencoded in the text are not what the font's glyphs stand for
+        allowed[np.flatnonzero(stats.occurrences[glyph_count:-1])] = False
+        for symbol, mapping in fixed.items():
+            if len(mapping) == 1:
+                allowed[first[symbol]] = False
+        if not allowed.any():
+            allowed[:boundary] = True
+
+        by_frequency = [index for index in np.argsort(-model.unigram, kind='stable') if allowed[index]]
+        owner: Dict[int, int] = {}
+        for rank, symbol in enumerate(free):
+            char = by_frequency[rank % len(by_frequency)]
+            first[symbol] = last[symbol] = char
+            owner.setdefault(char, symbol)
+
+        row_order = np.argsort(stats.rows, kind='stable')
+        col_order = np.argsort(stats.cols, kind='stable')
+        row_ptr = np.searchsorted(stats.rows[row_order], np.arange(size + 1))
+        col_ptr = np.searchsorted(stats.cols[col_order], np.arange(size + 1))
+
+        def entries(symbols) -> 'np.ndarray':
+            parts = []
+            for symbol in symbols:
+                parts.append(row_order[row_ptr[symbol] : row_ptr[symbol + 1]])
+                parts.append(col_order[col_ptr[symbol] : col_ptr[symbol + 1]])
+            return np.unique(np.concatenate(parts))
+
+        def local_score(index: 'np.ndarray') -> float:
+            return float(stats.counts[index] @ log_bigram[last[stats.rows[index]], first[stats.cols[index]]])
+
+        def marginal(symbol: int) -> 'np.ndarray':
+            """Score of every character for one symbol, everything else held fixed"""
+            right = row_order[row_ptr[symbol] : row_ptr[symbol + 1]]
+            left = col_order[col_ptr[symbol] : col_ptr[symbol + 1]]
+            right = right[stats.cols[right] != symbol]
+            left = left[stats.rows[left] != symbol]
+            scores = log_bigram[:, first[stats.cols[right]]] @ stats.counts[right]
+            scores += stats.counts[left] @ log_bigram[last[stats.rows[left]], :]
+            diagonal = stats.counts[(stats.rows == symbol) & (stats.cols == symbol)].sum()
+            if diagonal:
+                scores += diagonal * np.diag(log_bigram)
+            return np.where(allowed, scores, -np.inf)
+
+        def assign(symbol: int, char: int, partner: Optional[int], previous: int):
+            first[symbol] = last[symbol] = char
+            if partner is not None:
+                first[partner] = last[partner] = previous
+
+        def move_delta(symbol: int, char: int) -> float:
+            """Exact score change of giving `symbol` the character, swapping with the free glyph holding it"""
+            current = first[symbol]
+            partner = owner.get(char)
+            index = entries([symbol] if partner is None else [symbol, partner])
+            before = local_score(index)
+            assign(symbol, char, partner, current)
+            delta = local_score(index) - before
+            assign(symbol, current, partner, char)
+            return delta
+
+        for sweep in range(MAX_SWEEPS):
+            moves = 0
+            for symbol in free:
+                current = first[symbol]
+                for char in np.argsort(-marginal(symbol))[:MOVE_CANDIDATES]:
+                    if char == current:
+                        break
+                    if move_delta(symbol, char) > 1e-9:
+                        partner = owner.get(char)
+                        assign(symbol, char, partner, current)
+                        if owner.get(current) == symbol:
+                            del owner[current]
+                        owner[char] = symbol
+                        if partner is not None:
+                            owner[current] = partner
+                        moves += 1
+                        break
+            if not moves:
+                break
+        logger.info(f'Frequency solver converged after {sweep + 1} sweeps over {len(free)} glyphs')
+
+        # Confidence compares the chosen character with the best alternative moves, swaps included
+        proposals = {}
+        for symbol in free:
+            current = first[symbol]
+            candidates = [char for char in np.argsort(-marginal(symbol))[:MOVE_CANDIDATES] if char != current]
+            deltas = np.array([0.0] + [move_delta(symbol, char) for char in candidates])
+            probabilities = np.exp(deltas - deltas.max())
+            probabilities /= probabilities.sum()
+            chars = [current] + candidates
+            ranked = np.argsort(-probabilities, kind='stable')[:top_k]
+            proposals[symbol] = {
+                'mapping': model.chars[current],
+                'confidence': round(float(probabilities[0]), 4),
+                'occurrences': int(stats.occurrences[symbol]),
+                'alternatives': [
+                    {'char': model.chars[chars[rank]], 'confidence': round(float(probabilities[rank]), 4)}
+                    for rank in ranked
+                ],
+            }
+        return proposals
+
+    @staticmethod
+    def propose_mappings(db: Session, font_file_id: int, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Proposals for the font's unmapped glyphs that occur in any SVG or PDF of the font family"""
+        font_file = db.query(FontFile).filter(FontFile.id == font_file_id).first()
+        if not font_file:
+            return []
+
+        model = FrequencySolver.language_model()
+        family_fonts = [font_file] + (
+            db.query(FontFile).filter(FontFile.font_name == font_file.font_name, FontFile.id != font_file.id).all()
+        )
+        glyphs = (
+            db.query(Glyph.id, Glyph.codepoint, Glyph.mapping, Glyph.is_mapped)
+            .filter(Glyph.font_file_id == font_file_id, Glyph.is_retired == False)
+            .order_by(Glyph.id)
+            .all()
+        )
+        keys = [glyph.codepoint for glyph in glyphs]
+
+        # Confirmed mappings of the family's other fonts fill in for glyphs this font has not mapped yet
+        fixed_by_key = {
+            codepoint: mapping
+            for codepoint, mapping in db.query(Glyph.codepoint, Glyph.mapping).filter(
+                Glyph.font_file_id.in_([font.id for font in family_fonts[1:]]),
+                Glyph.is_mapped == True,
+                Glyph.is_retired == False,
+            )
+            if mapping
+        }
+        fixed_by_key.update({glyph.codepoint: glyph.mapping for glyph in glyphs if glyph.is_mapped and glyph.mapping})
+        fixed = {index: fixed_by_key[key] for index, key in enumerate(keys) if key in fixed_by_key}
+
+        with span('frequency_solver'):
+            stats = FrequencySolver.collect_stats(db, family_fonts, keys, model)
+            proposals = FrequencySolver.solve(stats, model, fixed, top_k)
+
+        results = []
+        for symbol, proposal in proposals.items():
+            glyph = glyphs[symbol]
+            results.append({'glyph_id': glyph.id, 'codepoint': glyph.codepoint, **proposal})
+        for symbol, mapping in fixed.items():
+            glyph = glyphs[symbol]
+            if not glyph.is_mapped:
+                results.append(
+                    {
+                        'glyph_id': glyph.id,
+                        'codepoint': glyph.codepoint,
+                        'mapping': mapping,
+                        'confidence': 1.0,
+                        'occurrences': int(stats.occurrences[symbol]),
+                        'alternatives': [{'char': mapping, 'confidence': 1.0}],
+                    }
+                )
+        results.sort(key=lambda result: -result['occurrences'])
+        return results
@@ -0,0 +1,190 @@
+import base64
+import logging
+import threading
+import unicodedata
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from metrics import span
+from services.font_service import FontService, FONTTOOLS_AVAILABLE, PIL_AVAILABLE
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if FONTTOOLS_AVAILABLE:
+    from fontTools.ttLib import TTFont
+
+if PIL_AVAILABLE:
+    from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Canvas and font size used by FontService.generate_png_for_glyph, templates are drawn the same way
+CANVAS_SIZE = 128
+RENDER_SIZE = 48
+
+
+class TemplateBankError(RuntimeError):
+    """None of RECOGNIZER_FONTS could be rendered into templates"""
+
+
+class GlyphRecognizer:
+    """Offline glyph recognizer matching rendered previews against a bank of reference character templates.
+
+    Templates are drawn exactly like the previews, downsampled and normalized to zero mean and unit length, so one
+    matrix product gives the normalized cross-correlation of every glyph against every template. Glyphs are not
+    rescaled to fill the template, which keeps case and superscripts apart (c/C, 1/¹).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bank = None
+        self._labels: List[str] = []
+        self._label_starts = None
+        self._bank_key = None
+
+    @staticmethod
+    def _normalize(images: 'np.ndarray') -> 'np.ndarray':
+        """Flatten (n, size, size) ink images into zero-mean, unit-length rows"""
+        vectors = images.reshape(len(images), -1).astype(np.float32)
+        vectors -= vectors.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-6)
+
+    @staticmethod
+    def _ink_image(image: 'Image.Image') -> Optional['np.ndarray']:
+        """Ink of a centered glyph rendering at template resolution, keeping its size relative to the canvas"""
+        size = settings.RECOGNIZER_TEMPLATE_SIZE
+        ink = image.convert('L').point(lambda value: 255 - value)
+        if not ink.getbbox():
+            return None
+        return np.asarray(ink.resize((size, size), Image.BOX), dtype=np.uint8)
+
+    @staticmethod
+    def _decode_preview(png_base64: str) -> Optional['np.ndarray']:
+        if not png_base64 or not png_base64.startswith('data:image/png;base64,'):
+            return None
+        try:
+            image = Image.open(BytesIO(base64.b64decode(png_base64.split(',', 1)[1])))
+            return GlyphRecognizer._ink_image(image)
+        except Exception as e:
+            logger.debug(f'Could not decode preview: {e}')
+            return None
+
+    @staticmethod
+    def _font_alphabet(font_path: str) -> List[str]:
+        """Configured alphabet, or every printable character the reference font covers"""
+        with TTFont(font_path, lazy=True) as font:
+            cmap = font.getBestCmap() or {}
+        if settings.RECOGNIZER_ALPHABET:
+            return [char for char in dict.fromkeys(settings.RECOGNIZER_ALPHABET) if ord(char) in cmap]
+        return [
+            chr(codepoint)
+            for codepoint in sorted(cmap)
+            if unicodedata.category(chr(codepoint))[0] in 'LNPS' and codepoint < 0xE000
+        ]
+
+    @staticmethod
+    def _render_templates(font_path: str) -> List[Tuple[str, 'np.ndarray']]:
+        working_path = font_path
+        temp_path = None
+        if font_path.lower().endswith(('.woff', '.woff2')):
+            temp_path = working_path = FontService._convert_woff_to_ttf(font_path)
+            if not temp_path:
+                return []
+
+        try:
+            font = ImageFont.truetype(working_path, RENDER_SIZE)
+            templates = []
+            for char in GlyphRecognizer._font_alphabet(working_path):
+                image = Image.new('L', (CANVAS_SIZE, CANVAS_SIZE), 255)
+                draw = ImageDraw.Draw(image)
+                bbox = draw.textbbox((0, 0), char, font=font)
+                x = (CANVAS_SIZE - (bbox[2] - bbox[0])) // 2 - bbox[0]
+                y = (CANVAS_SIZE - (bbox[3] - bbox[1])) // 2 - bbox[1]
+                draw.text((x, y), char, font=font, fill=0)
+
+                ink = GlyphRecognizer._ink_image(image)
+                if ink is not None:
+                    templates.append((char, ink))
+            return templates
+        finally:
+            if temp_path:
+                Path(temp_path).unlink(missing_ok=True)
+
+    @staticmethod
+    def is_available() -> bool:
+        if not (NUMPY_AVAILABLE and PIL_AVAILABLE and FONTTOOLS_AVAILABLE):
+            return False
+        return any(Path(font_path).is_file() for font_path in settings.RECOGNIZER_FONTS)
+
+    def _ensure_bank(self):
+        key = (tuple(settings.RECOGNIZER_FONTS), settings.RECOGNIZER_ALPHABET, settings.RECOGNIZER_TEMPLATE_SIZE)
+        if self._bank is not None and self._bank_key == key:
+            return
+
+        with self._lock:
+            if self._bank is not None and self._bank_key == key:
+                return
+
+            with span('template_bank_build'):
+                templates = []
+                for font_path in settings.RECOGNIZER_FONTS:
+                    try:
+                        templates.extend(self._render_templates(font_path))
+                    except Exception as e:
+                        logger.warning(f'Could not render reference font {font_path}: {e}')
+
+                if not templates:
+                    raise TemplateBankError('No templates could be rendered from RECOGNIZER_FONTS')
+
+                # Group templates of the same character so per-character best scores are one reduceat
+                templates.sort(key=lambda template: template[0])
+                chars = [char for char, _ in templates]
+                self._labels = list(dict.fromkeys(chars))
+                first_index = {}
+                for index, char in enumerate(chars):
+                    first_index.setdefault(char, index)
+                self._label_starts = np.array([first_index[char] for char in self._labels])
+                self._bank = self._normalize(np.stack([ink for _, ink in templates]))
+                self._bank_key = key
+
+            logger.info(f'Built template bank: {len(templates)} templates for {len(self._labels)} characters')
+
+    def rank(self, previews: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Ranked (char, confidence) candidates for each rendered preview PNG, best first"""
+        self._ensure_bank()
+
+        images = [self._decode_preview(preview) for preview in previews]
+        valid = [index for index, image in enumerate(images) if image is not None]
+        results: List[List[Dict[str, Any]]] = [[] for _ in previews]
+        if not valid:
+            return results
+
+        with span('template_match'):
+            vectors = self._normalize(np.stack([images[index] for index in valid]))
+            scores = vectors @ self._bank.T
+            label_scores = np.maximum.reduceat(scores, self._label_starts, axis=1)
+
+            top_k = min(top_k, len(self._labels))
+            top = np.argpartition(-label_scores, top_k - 1, axis=1)[:, :top_k]
+            top_scores = np.take_along_axis(label_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for row, index in enumerate(valid):
+            results[index] = [
+                {'char': self._labels[label], 'confidence': round(float(max(score, 0.0)), 4)}
+                for label, score in zip(top[row], top_scores[row])
+            ]
+        return results
+
+
+glyph_recognizer = GlyphRecognizer()
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.models import MAPPING_COUNTER, FontFile, Glyph, SyncCounter
+
+
+class MappingFeed:
+    """Incremental sync of glyph mappings between concurrent editors.
+
+    Every mapping change carries a revision (see models._stamp_mapping_revisions). Clients load the font tree once,
+    remember its revision and from then on only ask for changes after it. Long-polling clients are woken when a
+    session of this process commits a mapping change; changes made by other processes are noticed by re-checking.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @staticmethod
+    def current_revision(db: Session) -> int:
+        value = db.query(SyncCounter.value).filter(SyncCounter.name == MAPPING_COUNTER).scalar()
+        return value or 0
+
+    @staticmethod
+    def changes_since(
+        db: Session, since: int, font_id: Optional[int] = None, svg_file_id: Optional[int] = None, limit: int = 500
+    ) -> Dict[str, Any]:
+        """Current state of glyphs whose mapping changed after revision `since`, oldest change first.
+
+        `revision` is where the next request continues. A truncated page ends at a revision boundary, so changes
+        made together are never split across pages.
+        """
+        # Read before the changes, a change committed in between is then returned now or on the next request
+        revision = MappingFeed.current_revision(db)
+
+        query = db.query(
+            Glyph.id,
+            Glyph.font_file_id,
+            Glyph.codepoint,
+            Glyph.mapping,
+            Glyph.is_mapped,
+            Glyph.is_retired,
+            Glyph.outline_hash,
+            Glyph.revision,
+        ).filter(Glyph.revision > since)
+        if font_id is not None:
+            query = query.filter(Glyph.font_file_id == font_id)
+        if svg_file_id is not None:
+            query = query.join(FontFile, FontFile.id == Glyph.font_file_id).filter(FontFile.svg_file_id == svg_file_id)
+        query = query.order_by(Glyph.revision, Glyph.id)
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        if has_more:
+            cutoff = rows[limit].revision
+            rows = [row for row in rows if row.revision < cutoff]
+            if not rows:
+                # A single change larger than a page is returned whole
+                rows = query.filter(Glyph.revision == cutoff).all()
+            revision = rows[-1].revision
+        elif rows:
+            revision = max(revision, rows[-1].revision)
+
+        return {
+            'revision': revision,
+            'has_more': has_more,
+            'changes': [
+                {
+                    'glyph_id': row.id,
+                    'font_id': row.font_file_id,
+                    'codepoint': row.codepoint,
+                    'mapping': row.mapping,
+                    'is_mapped': row.is_mapped,
+                    'is_retired': row.is_retired,
+                    'outline_hash': row.outline_hash,
+                    'revision': row.revision,
+                }
+                for row in rows
+            ],
+        }
+
+    def listen(self) -> asyncio.Event:
+        """Event set on the next committed mapping change; register before checking for changes, then wait on it"""
+        waiter = asyncio.Event()
+        with self._lock:
+            self._waiters.append((asyncio.get_running_loop(), waiter))
+        return waiter
+
+    def unlisten(self, waiter: asyncio.Event):
+        with self._lock:
+            self._waiters = [(loop, other) for loop, other in self._waiters if other is not waiter]
+
+    def notify(self):
+        """Wake every listener; called from whichever thread committed the change"""
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # The listener's event loop has already been closed
+                pass
+
+
+mapping_feed = MappingFeed()
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_mapping_listeners(session: Session):
+    if session.info.pop('mapping_revision', None) is not None:
+        mapping_feed.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_mapping_revision(session: Session):
+    session.info.pop('mapping_revision', None)
@@ -0,0 +1,496 @@
+import re
+import json
+import uuid
+import hashlib
+import importlib.util
+import logging
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from metrics import errors, span
+from database.database import SessionLocal
+from database.models import FontFile, Glyph, GlyphOccurrence, PDFFile, PDFPage, PDFTextRun
+from services.font_index import font_index
+from services.font_service import FontService, FONTTOOLS_AVAILABLE, UPLOAD_DIR
+from services.svg_service import SVGService, upload_progress
+from services.scheduler import PRIORITY_BULK, JobCancelled, QueueFullError, scheduler
+
+# pypdf is imported when a PDF is read, it is by far the slowest import of the API
+PYPDF_AVAILABLE = importlib.util.find_spec('pypdf') is not None
+
+logger = logging.getLogger(__name__)
+
+# Subset fonts carry a random six-letter tag, e.g. ABCDEF+Amiri-Regular
+SUBSET_PREFIX_PATTERN = re.compile(r'^[A-Z]{6}\+')
+TEXT_SHOW_OPERATORS = {b'Tj', b'TJ', b"'", b'"'}
+# Resolved PDF objects are dropped from the reader's cache every this many pages to bound memory
+READER_CACHE_FLUSH_PAGES = 20
+
+
+@dataclass
+class EmbeddedFont:
+    """A font resource of the PDF, resolved to the stored FontFile and a code -> Glyph.codepoint lookup"""
+
+    font_file_id: int
+    code_width: int
+    resolve: Callable[[int], Optional[str]]
+    cache: Dict[int, Optional[str]] = field(default_factory=dict)
+
+    def glyph_key(self, code: int) -> Optional[str]:
+        if code not in self.cache:
+            self.cache[code] = self.resolve(code)
+        return self.cache[code]
+
+
+@dataclass
+class TextState:
+    font: Optional[EmbeddedFont] = None
+    matrix: Tuple[float, ...] = (1, 0, 0, 1, 0, 0)
+    line_x: float = 0
+    line_y: float = 0
+    leading: float = 0
+
+    def move_line(self, tx: float, ty: float):
+        a, b, c, d, _, _ = self.matrix
+        self.line_x += tx * a + ty * c
+        self.line_y += tx * b + ty * d
+
+
+class PDFService:
+    @staticmethod
+    def _operand_bytes(operand) -> bytes:
+        original = getattr(operand, 'original_bytes', None)
+        if original is not None:
+            return original
+        if isinstance(operand, bytes):
+            return operand
+        return str(operand).encode('latin-1', errors='replace')
+
+    @staticmethod
+    def _font_program(font_dict) -> Optional[Tuple[bytes, str]]:
+        """Embedded TrueType / OpenType program of a font resource as (data, file suffix)"""
+        descriptor_owner = font_dict
+        if font_dict.get('/Subtype') == '/Type0':
+            descendants = font_dict.get('/DescendantFonts')
+            if not descendants:
+                return None
+            descriptor_owner = descendants.get_object()[0].get_object()
+
+        descriptor = descriptor_owner.get('/FontDescriptor')
+        if descriptor is None:
+            return None
+        descriptor = descriptor.get_object()
+
+        if '/FontFile2' in descriptor:
+            return descriptor['/FontFile2'].get_object().get_data(), '.ttf'
+        if '/FontFile3' in descriptor:
+            stream = descriptor['/FontFile3'].get_object()
+            if stream.get('/Subtype') == '/OpenType':
+                return stream.get_data(), '.otf'
+        # Bare Type 1 (FontFile) and CFF (FontFile3/Type1C) programs cannot be loaded by fontTools as fonts
+        return None
+
+    @staticmethod
+    def _simple_font_resolver(font_dict, font) -> Callable[[int], Optional[str]]:
+        """Code -> glyph name for single-byte fonts: /Differences, then the font's own cmaps"""
+        glyph_names = set(font.getGlyphOrder())
+        differences = {}
+        encoding = font_dict.get('/Encoding')
+        base_codec = 'cp1252'
+        if encoding is not None:
+            encoding = encoding.get_object()
+            if encoding == '/MacRomanEncoding':
+                base_codec = 'mac_roman'
+            elif hasattr(encoding, 'get'):
+                if encoding.get('/BaseEncoding') == '/MacRomanEncoding':
+                    base_codec = 'mac_roman'
+                code = 0
+                for item in encoding.get('/Differences', []):
+                    item = item.get_object() if hasattr(item, 'get_object') else item
+                    if isinstance(item, int):
+                        code = int(item)
+                    else:
+                        differences[code] = str(item).lstrip('/')
+                        code += 1
+
+        # Copied into plain dicts, the resolver outlives the font it was built from
+        cmap_table = font['cmap'] if 'cmap' in font else None
+        symbol_cmap = cmap_table.getcmap(3, 0) if cmap_table else None
+        symbol_cmap = dict(symbol_cmap.cmap) if symbol_cmap else None
+        mac_cmap = cmap_table.getcmap(1, 0) if cmap_table else None
+        mac_cmap = dict(mac_cmap.cmap) if mac_cmap else None
+        best_cmap = dict(font.getBestCmap() or {})
+
+        def resolve(code: int) -> Optional[str]:
+            name = differences.get(code)
+            if name in glyph_names:
+                return name
+            if symbol_cmap:
+                for candidate in (0xF000 + code, 0xF100 + code, 0xF200 + code, code):
+                    if candidate in symbol_cmap:
+                        return symbol_cmap[candidate]
+            if mac_cmap and code in mac_cmap:
+                return mac_cmap[code]
+            try:
+                return best_cmap.get(ord(bytes([code]).decode(base_codec)))
+            except UnicodeDecodeError:
+                return None
+
+        return resolve
+
+    @staticmethod
+    def _cid_font_resolver(font_dict, font) -> Callable[[int], Optional[str]]:
+        """CID -> glyph name for Type0 fonts with Identity-H/V encoding"""
+        glyph_order = list(font.getGlyphOrder())
+        descendant = font_dict['/DescendantFonts'].get_object()[0].get_object()
+        cid_to_gid = descendant.get('/CIDToGIDMap')
+        gid_map = None
+        if cid_to_gid is not None and cid_to_gid.get_object() != '/Identity':
+            data = cid_to_gid.get_object().get_data()
+            gid_map = [int.from_bytes(data[i : i + 2], 'big') for i in range(0, len(data) - 1, 2)]
+
+        # CID-keyed CFF fonts name their glyphs after CIDs
+        cid_keyed = 'CFF ' in font and glyph_order and glyph_order[-1].startswith('cid')
+        glyph_names = set(glyph_order) if cid_keyed else None
+
+        def resolve(cid: int) -> Optional[str]:
+            if cid_keyed:
+                name = f'cid{cid:05d}'
+                return name if name in glyph_names else None
+            gid = gid_map[cid] if gid_map is not None and cid < len(gid_map) else cid
+            return glyph_order[gid] if gid < len(glyph_order) else None
+
+        return resolve
+
+    @staticmethod
+    def _load_font(db: Session, pdf_file: PDFFile, font_dict, fonts_by_hash: Dict[str, int]) -> Optional[EmbeddedFont]:
+        """Store a font resource's program (once per distinct program) and build its code resolver"""
+        program = PDFService._font_program(font_dict)
+        if program is None:
+            logger.info(f'Font {font_dict.get("/BaseFont")} has no supported embedded program, skipping')
+            return None
+
+        data, suffix = program
+        content_hash = hashlib.sha256(data).hexdigest()
+        base_font = SUBSET_PREFIX_PATTERN.sub('', str(font_dict.get('/BaseFont', 'font')).lstrip('/'))
+        # Decoded names may contain '/' (#2F), only the last part is usable in a file name
+        base_font = Path(base_font).name or 'font'
+        filename = f'{base_font}{suffix}'
+
+        font_file_id = fonts_by_hash.get(content_hash)
+        if font_file_id is None:
+            file_path = UPLOAD_DIR / 'fonts' / f'{uuid.uuid4()}_{filename}'
+            file_path.write_bytes(data)
+
+            db_font = FontFile(
+                pdf_file_id=pdf_file.id,
+                font_name=base_font,
+                filename=filename,
+                upload_path=str(file_path),
+                content_hash=content_hash,
+            )
+            db.add(db_font)
+            db.commit()
+            font_index.register(db_font.id, str(file_path), filename)
+            FontService.generate_glyphs_from_font(db, db_font.id, str(file_path))
+
+            font_file_id = fonts_by_hash[content_hash] = db_font.id
+        else:
+            file_path = Path(db.get(FontFile, font_file_id).upload_path)
+
+        from fontTools.ttLib import TTFont
+
+        # Resolvers copy what they need, the font is closed before the pages are walked
+        with TTFont(str(file_path), lazy=True) as font:
+            reverse_cmap = {name: codepoint for codepoint, name in (font.getBestCmap() or {}).items()}
+            if font_dict.get('/Subtype') == '/Type0':
+                code_width, resolve_name = 2, PDFService._cid_font_resolver(font_dict, font)
+            else:
+                code_width, resolve_name = 1, PDFService._simple_font_resolver(font_dict, font)
+
+        def resolve(code: int) -> Optional[str]:
+            name = resolve_name(code)
+            return FontService.glyph_key(name, reverse_cmap) if name else None
+
+        return EmbeddedFont(font_file_id=font_file_id, code_width=code_width, resolve=resolve)
+
+    @staticmethod
+    def _iter_runs(page, fonts: Dict[str, Optional[EmbeddedFont]]) -> Iterator[Dict[str, Any]]:
+        """Walk a page's content stream and yield text runs: consecutive shows with one font on one line"""
+        contents = page.get_contents()
+        if contents is None:
+            return
+
+        state = TextState()
+        run = None
+
+        def flush():
+            nonlocal run
+            if run and run['codes']:
+                yield run
+            run = None
+
+        for operands, operator in contents.operations:
+            if operator == b'BT':
+                state.matrix = (1, 0, 0, 1, 0, 0)
+                state.line_x = state.line_y = 0
+            elif operator == b'ET':
+                yield from flush()
+            elif operator == b'Tf':
+                yield from flush()
+                state.font = fonts.get(str(operands[0]))
+            elif operator == b'TL':
+                state.leading = float(operands[0])
+            elif operator == b'Tm':
+                yield from flush()
+                state.matrix = tuple(float(value) for value in operands)
+                state.line_x, state.line_y = state.matrix[4], state.matrix[5]
+            elif operator in (b'Td', b'TD'):
+                yield from flush()
+                if operator == b'TD':
+                    state.leading = -float(operands[1])
+                state.move_line(float(operands[0]), float(operands[1]))
+            elif operator == b'T*':
+                yield from flush()
+                state.move_line(0, -state.leading)
+            elif operator in TEXT_SHOW_OPERATORS:
+                if operator in (b"'", b'"'):
+                    yield from flush()
+                    state.move_line(0, -state.leading)
+
+                font = state.font
+                if font is None:
+                    continue
+
+                if operator == b'TJ':
+                    strings = [item for item in operands[0] if not isinstance(item, (int, float))]
+                else:
+                    strings = [operands[-1]]
+
+                data = b''.join(PDFService._operand_bytes(string) for string in strings)
+                codes = [
+                    int.from_bytes(data[i : i + font.code_width], 'big')
+                    for i in range(0, len(data) - font.code_width + 1, font.code_width)
+                ]
+
+                if run is None or run['font'] is not font:
+                    yield from flush()
+                    run = {'font': font, 'codes': [], 'x': state.line_x, 'y': state.line_y}
+                run['codes'].extend(codes)
+
+        yield from flush()
+
+    @staticmethod
+    def ingest_pdf(
+        db: Session, pdf_path: Path, filename: str, progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """Extract embedded fonts and per-page text runs from a PDF, page by page"""
+        if not (PYPDF_AVAILABLE and FONTTOOLS_AVAILABLE):
+            raise RuntimeError('pypdf and fonttools are required for PDF ingestion')
+
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(pdf_path))
+        page_count = len(reader.pages)
+
+        pdf_file = PDFFile(filename=filename, upload_path=str(pdf_path), page_count=page_count)
+        db.add(pdf_file)
+        db.commit()
+
+        fonts_by_hash: Dict[str, int] = {}
+        # Font resources keyed by indirect object number, shared by every page that references them
+        fonts_by_ref: Dict[Any, Optional[EmbeddedFont]] = {}
+        run_count = 0
+        key_counts: Dict[int, Counter] = {}
+
+        for page_number, page in enumerate(reader.pages, start=1):
+            with span('pdf_page'):
+                resources = page.get('/Resources')
+                page_fonts = {}
+                font_resources = resources.get_object().get('/Font') if resources is not None else None
+                for name, ref in font_resources.get_object().items() if font_resources is not None else []:
+                    key = getattr(ref, 'idnum', None) or id(ref)
+                    if key not in fonts_by_ref:
+                        try:
+                            fonts_by_ref[key] = PDFService._load_font(db, pdf_file, ref.get_object(), fonts_by_hash)
+                        except Exception as e:
+                            errors.inc(component='pdf_font')
+                            logger.warning(f'Could not load font {name} on page {page_number}: {e}')
+                            fonts_by_ref[key] = None
+                    page_fonts[str(name)] = fonts_by_ref[key]
+
+                box = page.mediabox
+                db_page = PDFPage(
+                    pdf_file_id=pdf_file.id,
+                    page_number=page_number,
+                    width=float(box.width),
+                    height=float(box.height),
+                )
+                db.add(db_page)
+                db.flush()
+
+                rows = []
+                try:
+                    for sequence, run in enumerate(PDFService._iter_runs(page, page_fonts)):
+                        font = run['font']
+                        hex_digits = font.code_width * 2
+                        keys = [font.glyph_key(code) for code in run['codes']]
+                        key_counts.setdefault(font.font_file_id, Counter()).update(keys)
+                        rows.append(
+                            {
+                                'pdf_page_id': db_page.id,
+                                'font_file_id': font.font_file_id,
+                                'sequence': sequence,
+                                'x': run['x'],
+                                'y': run['y'],
+                                'glyph_codes': ' '.join(f'{code:0{hex_digits}X}' for code in run['codes']),
+                                'glyph_keys': json.dumps(keys),
+                            }
+                        )
+                except Exception as e:
+                    errors.inc(component='pdf_page')
+                    logger.warning(f'Could not parse content of page {page_number}: {e}')
+
+                if rows:
+                    db.execute(insert(PDFTextRun), rows)
+                db.commit()
+                run_count += len(rows)
+
+            if page_number % READER_CACHE_FLUSH_PAGES == 0 and hasattr(reader, 'resolved_objects'):
+                reader.resolved_objects.clear()
+
+            if progress_callback:
+                progress_callback(page_number, page_count)
+
+        PDFService.index_glyph_occurrences(db, pdf_file.id, key_counts)
+
+        return {
+            'pdf_file_id': pdf_file.id,
+            'filename': filename,
+            'page_count': page_count,
+            'font_ids': sorted(fonts_by_hash.values()),
+            'text_runs': run_count,
+        }
+
+    @staticmethod
+    def index_glyph_occurrences(db: Session, pdf_file_id: int, key_counts: Dict[int, Counter]):
+        """Record per-glyph occurrence counts of a PDF in the inverted index"""
+        rows = []
+        for glyph_id, font_file_id, codepoint in db.query(Glyph.id, Glyph.font_file_id, Glyph.codepoint).filter(
+            Glyph.font_file_id.in_(list(key_counts)), Glyph.is_retired == False
+        ):
+            count = key_counts[font_file_id].get(codepoint, 0)
+            if count:
+                rows.append({'glyph_id': glyph_id, 'pdf_file_id': pdf_file_id, 'count': count})
+
+        if rows:
+            db.execute(insert(GlyphOccurrence), rows)
+        db.commit()
+
+    @staticmethod
+    def process_pdf_in_background(task_id: str, pdf_path: Path, filename: str):
+        """Process an uploaded PDF in a background thread, reporting progress like ZIP uploads"""
+        db = SessionLocal()
+        try:
+
+            def report(page_number: int, page_count: int):
+                scheduler.check_cancelled(task_id)
+                SVGService.update_progress(
+                    task_id, min(page_number, page_count - 1), page_count, f'Processed page {page_number}/{page_count}'
+                )
+
+            result = PDFService.ingest_pdf(db, pdf_path, filename, report)
+            upload_progress[task_id] = {
+                'current': 100,
+                'total': 100,
+                'percentage': 100,
+                'message': f'Completed! Processed {result["page_count"]} pages',
+                'completed': True,
+                'result': result,
+            }
+        except JobCancelled:
+            logger.info(f'PDF task {task_id} cancelled')
+            SVGService.mark_cancelled(task_id)
+        except Exception as e:
+            errors.inc(component='pdf')
+            logger.exception('Error in PDF processing')
+            upload_progress[task_id] = {
+                'current': 100,
+                'total': 100,
+                'percentage': 100,
+                'message': f'Error: {e}',
+                'completed': True,
+                'error': str(e),
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def start_pdf_processing(pdf_path: Path, filename: str, client: Optional[str] = None) -> str:
+        """Queue background PDF processing and return task ID. Raises QueueFullError when the queue is full"""
+        task_id = str(uuid.uuid4())
+        SVGService.update_progress(task_id, 0, 100, 'Waiting in queue...')
+        try:
+            scheduler.submit(
+                PDFService.process_pdf_in_background,
+                (task_id, pdf_path, filename),
+                task_id=task_id,
+                priority=PRIORITY_BULK,
+                client=client,
+                on_cancel=lambda: SVGService.mark_cancelled(task_id),
+            )
+        except QueueFullError:
+            upload_progress.pop(task_id, None)
+            raise
+        return task_id
+
+    @staticmethod
+    def get_mapping_by_key(db: Session, font_file_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """font_file_id -> {Glyph.codepoint: mapping} for mapped glyphs"""
+        tables: Dict[int, Dict[str, str]] = {font_file_id: {} for font_file_id in font_file_ids}
+        rows = (
+            db.query(Glyph.font_file_id, Glyph.codepoint, Glyph.mapping)
+            .filter(Glyph.font_file_id.in_(font_file_ids), Glyph.is_mapped == True, Glyph.is_retired == False)
+            .all()
+        )
+        for font_file_id, codepoint, mapping in rows:
+            tables[font_file_id][codepoint] = mapping
+        return tables
+
+    @staticmethod
+    def decode_key(key: Optional[str], table: Dict[str, str]) -> str:
+        if key is None:
+            return '�'
+        if key in table:
+            return table[key]
+        if key.startswith('U+'):
+            return chr(int(key[2:], 16))
+        return '�'
+
+    @staticmethod
+    def decode_page(db: Session, page: PDFPage) -> List[Dict[str, Any]]:
+        """Decoded text runs of a page using current glyph mappings"""
+        runs = page.text_runs
+        tables = PDFService.get_mapping_by_key(db, list({run.font_file_id for run in runs}))
+
+        decoded = []
+        for run in runs:
+            table = tables[run.font_file_id]
+            keys = json.loads(run.glyph_keys)
+            decoded.append(
+                {
+                    'font_id': run.font_file_id,
+                    'x': run.x,
+                    'y': run.y,
+                    'glyph_codes': run.glyph_codes.split(),
+                    'text': ''.join(PDFService.decode_key(key, table) for key in keys),
+                    'mapped': sum(1 for key in keys if key in table),
+                    'total': len(keys),
+                }
+            )
+        return decoded
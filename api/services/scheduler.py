@@ -0,0 +1,239 @@
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional
+
+from config import settings
+from metrics import errors, job_wait_seconds, jobs
+
+if TYPE_CHECKING:
+    from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower values run first
+PRIORITY_INTERACTIVE = 0  # work a user is waiting on, e.g. preview renders
+PRIORITY_DEFAULT = 1  # follow-up work such as search index refreshes
+PRIORITY_BULK = 2  # ZIP and PDF ingestion
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_DEFAULT: 'default', PRIORITY_BULK: 'bulk'}
+
+# Assumed run time of a job class before any has finished, for Retry-After estimates
+DEFAULT_JOB_SECONDS = 5.0
+
+
+class QueueFullError(Exception):
+    """The scheduler cannot take more work from this client right now"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def client_key(request: 'Request') -> str:
+    """Fairness key of the client behind a request"""
+    return request.client.host if request.client else 'unknown'
+
+
+@dataclass
+class Job:
+    task_id: str
+    priority: int
+    client: Optional[str]
+    func: Callable
+    args: tuple
+    on_cancel: Optional[Callable[[], None]] = None
+    started: bool = False
+    future: Future = field(default_factory=Future)
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class JobScheduler:
+    """Worker pool running background jobs by priority class, round-robin between clients within a class.
+
+    Jobs submitted for a client are bounded: once the queue, or that client's share of it, is full, `submit` raises
+    QueueFullError with a retry estimate instead of queueing without limit. Internal jobs (no client) are always
+    accepted. Bulk jobs never occupy the SCHEDULER_RESERVED_WORKERS, so interactive work starts promptly even
+    while large uploads are processed. Cancellation is cooperative: queued jobs are dropped, running jobs poll
+    `is_cancelled`.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # priority -> client -> queued jobs; the client order is the round-robin order
+        self._queues: Dict[int, 'OrderedDict[Optional[str], Deque[Job]]'] = {}
+        self._queued: Dict[int, int] = {}
+        # Queued and running jobs by task id
+        self._jobs: Dict[str, Job] = {}
+        self._running: Dict[int, int] = {}
+        # Moving average of run time per priority class
+        self._durations: Dict[int, float] = {}
+        self._workers: List[threading.Thread] = []
+        # Workers exit once the generation they were started in is shut down
+        self._generation = 0
+
+    def _worker_limit(self, priority: int) -> int:
+        if priority >= PRIORITY_BULK:
+            return max(1, settings.SCHEDULER_WORKERS - settings.SCHEDULER_RESERVED_WORKERS)
+        return max(1, settings.SCHEDULER_WORKERS)
+
+    def _retry_after(self, priority: int) -> int:
+        ahead = sum(count for p, count in self._queued.items() if p <= priority)
+        seconds = self._durations.get(priority, DEFAULT_JOB_SECONDS) * (ahead + 1) / self._worker_limit(priority)
+        return max(1, min(math.ceil(seconds), 3600))
+
+    def _ensure_workers(self):
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < max(1, settings.SCHEDULER_WORKERS):
+            # Daemon threads, so scripts that never shut the scheduler down can still exit
+            worker = threading.Thread(
+                target=self._work, args=(self._generation,), name=f'job-worker-{len(self._workers)}', daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(
+        self,
+        func: Callable,
+        args: tuple = (),
+        task_id: Optional[str] = None,
+        priority: int = PRIORITY_DEFAULT,
+        client: Optional[str] = None,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> Job:
+        """Queue `func(*args)`. Raises QueueFullError when the queue or the client's share of it is full"""
+        job = Job(task_id or str(uuid.uuid4()), priority, client, func, args, on_cancel)
+        with self._condition:
+            clients = self._queues.setdefault(priority, OrderedDict())
+            # Bounds are per priority class, a backlog of bulk uploads does not block a client's interactive work
+            if client is not None:
+                if self._queued.get(priority, 0) >= settings.SCHEDULER_MAX_QUEUED:
+                    raise QueueFullError('Server is busy, too many queued jobs', self._retry_after(priority))
+                if len(clients.get(client, ())) >= settings.SCHEDULER_MAX_QUEUED_PER_CLIENT:
+                    raise QueueFullError('Too many queued jobs for this client', self._retry_after(priority))
+
+            clients.setdefault(client, deque()).append(job)
+            self._queued[priority] = self._queued.get(priority, 0) + 1
+            self._jobs[job.task_id] = job
+            self._ensure_workers()
+            self._condition.notify()
+        return job
+
+    def _next_job(self) -> Optional[Job]:
+        for priority in sorted(self._queues):
+            clients = self._queues[priority]
+            if not clients or self._running.get(priority, 0) >= self._worker_limit(priority):
+                continue
+            client, queue = next(iter(clients.items()))
+            job = queue.popleft()
+            if queue:
+                clients.move_to_end(client)
+            else:
+                del clients[client]
+            self._queued[priority] -= 1
+            self._running[priority] = self._running.get(priority, 0) + 1
+            job.started = True
+            return job
+        return None
+
+    def _work(self, generation: int):
+        while True:
+            with self._condition:
+                job = None
+                while generation == self._generation:
+                    job = self._next_job()
+                    if job is not None:
+                        break
+                    self._condition.wait()
+                if job is None:
+                    return
+
+            priority = PRIORITY_NAMES.get(job.priority, str(job.priority))
+            job_wait_seconds.observe(time.monotonic() - job.queued_at, priority=priority)
+            job.future.set_running_or_notify_cancel()
+            start = time.monotonic()
+            try:
+                job.future.set_result(job.func(*job.args))
+                outcome = 'cancelled' if job.cancel_event.is_set() else 'done'
+            except JobCancelled as e:
+                job.future.set_exception(e)
+                outcome = 'cancelled'
+            except Exception as e:
+                errors.inc(component='job')
+                logger.exception(f'Background job {job.task_id} failed')
+                job.future.set_exception(e)
+                outcome = 'failed'
+            duration = time.monotonic() - start
+            jobs.inc(priority=priority, outcome=outcome)
+
+            with self._condition:
+                self._running[job.priority] -= 1
+                self._jobs.pop(job.task_id, None)
+                previous = self._durations.get(job.priority)
+                self._durations[job.priority] = duration if previous is None else 0.8 * previous + 0.2 * duration
+                # A freed bulk slot may unblock a queued bulk job another worker is waiting for
+                self._condition.notify_all()
+
+    def _drop(self, job: Job):
+        """Remove a queued job, the caller holds the lock"""
+        clients = self._queues[job.priority]
+        clients[job.client].remove(job)
+        if not clients[job.client]:
+            del clients[job.client]
+        self._queued[job.priority] -= 1
+        self._jobs.pop(job.task_id, None)
+        job.future.cancel()
+        jobs.inc(priority=PRIORITY_NAMES.get(job.priority, str(job.priority)), outcome='cancelled')
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        """Cancel a job: 'cancelled' if it was still queued, 'cancelling' if running, None if unknown or finished"""
+        with self._condition:
+            job = self._jobs.get(task_id)
+            if job is None:
+                return None
+            job.cancel_event.set()
+            if job.started:
+                return 'cancelling'
+            self._drop(job)
+
+        if job.on_cancel:
+            job.on_cancel()
+        return 'cancelled'
+
+    def is_cancelled(self, task_id: str) -> bool:
+        job = self._jobs.get(task_id)
+        return job is not None and job.cancel_event.is_set()
+
+    def check_cancelled(self, task_id: str):
+        if self.is_cancelled(task_id):
+            raise JobCancelled(task_id)
+
+    def shutdown(self, wait: bool = True):
+        """Drop queued jobs and stop the workers, waiting for running jobs to finish; later submits start a new pool"""
+        with self._condition:
+            dropped = [job for clients in self._queues.values() for queue in clients.values() for job in queue]
+            for job in dropped:
+                job.cancel_event.set()
+                self._drop(job)
+            workers, self._workers = self._workers, []
+            self._generation += 1
+            self._condition.notify_all()
+
+        for job in dropped:
+            if job.on_cancel:
+                job.on_cancel()
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+scheduler = JobScheduler()
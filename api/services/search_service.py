@@ -0,0 +1,73 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from metrics import span
+from database.models import FTS_TABLE
+
+logger = logging.getLogger(__name__)
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+class SearchService:
+    @staticmethod
+    def is_available(db: Session) -> bool:
+        row = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        return row is not None
+
+    @staticmethod
+    def upsert_documents(db: Session, documents: List[Tuple[int, str]]):
+        """Replace the indexed decoded text of SVGs, given as (svg_file_id, text) pairs"""
+        if not documents:
+            return
+        with span('search_index'):
+            db.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), [{'id': svg_id} for svg_id, _ in documents])
+            db.execute(
+                text(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (:id, :text)'),
+                [{'id': svg_id, 'text': body} for svg_id, body in documents],
+            )
+            db.commit()
+
+    @staticmethod
+    def to_match_expression(query: str) -> str:
+        """Quote every term so user input is matched literally, all terms required"""
+        terms = [term.replace('"', '""') for term in query.split()]
+        return ' '.join(f'"{term}"' for term in terms)
+
+    @staticmethod
+    def search(db: Session, query: str, offset: int, limit: int) -> Dict[str, Any]:
+        """Best-matching SVGs for a query with highlighted snippets, ranked by BM25"""
+        expression = SearchService.to_match_expression(query)
+        if not expression:
+            return {'total': 0, 'results': []}
+
+        try:
+            with span('search_query'):
+                total = db.execute(
+                    text(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q'), {'q': expression}
+                ).scalar()
+                rows = db.execute(
+                    text(
+                        f"SELECT rowid, snippet({FTS_TABLE}, 0, '<mark>', '</mark>', '…', 16), rank "
+                        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q ORDER BY rank LIMIT :limit OFFSET :offset'
+                    ),
+                    {'q': expression, 'limit': limit, 'offset': offset},
+                ).all()
+        except OperationalError as e:
+            raise SearchQueryError(str(e.orig)) from e
+
+        return {
+            'total': total,
+            'results': [
+                {'svg_file_id': svg_file_id, 'snippet': snippet, 'score': round(-score, 4)}
+                for svg_file_id, snippet, score in rows
+            ],
+        }
@@ -0,0 +1,258 @@
+import os
+import time
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Set, Tuple
+
+from sqlalchemy import exists, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import gc_reclaimed_bytes, span
+from database.database import SessionLocal, engine
+from database.models import FontFile, PDFFile, SVGBlob, SVGFile, UploadSession
+from services.font_service import UPLOAD_DIR
+from services.svg_storage import svg_storage
+
+logger = logging.getLogger(__name__)
+
+# Free pages returned to the filesystem per incremental vacuum step, each step is one short write transaction
+VACUUM_STEP_PAGES = 1024
+# Rows ANALYZE samples per index, keeps statistics refreshes fast on large tables
+ANALYSIS_LIMIT = 1000
+
+
+class StorageGC:
+    """Removes files and rows nothing references any more, then returns free database pages to the filesystem.
+
+    Safe while ingestion runs: nothing younger than GC_MIN_AGE_HOURS is touched, which covers font files written just
+    before their row is committed and uploads still waiting in the job queue. Blobs are deleted by statements that
+    re-check they are unreferenced, in one short transaction per batch.
+    """
+
+    @staticmethod
+    def _old_files(directory: Path, min_age_seconds: float) -> Iterator[Tuple[str, int]]:
+        """(path, size) of the files in a directory last modified longer ago than `min_age_seconds`"""
+        cutoff = time.time() - min_age_seconds
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        if stat.st_mtime < cutoff:
+                            yield entry.path, stat.st_size
+                except FileNotFoundError:
+                    continue
+
+    @staticmethod
+    def _referenced_names(db: Session, column, *criteria) -> Set[str]:
+        # Stored paths are relative to the working directory of the writer, file names are unique (uuid prefixes)
+        return {Path(path).name for (path,) in db.query(column).filter(column.isnot(None), *criteria)}
+
+    @staticmethod
+    def collect_orphan_files(db: Session, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+        """Delete upload files no row references. Returns files and bytes removed per upload directory"""
+        if not db.query(SVGFile.id).first() and not db.query(PDFFile.id).first():
+            # Most likely the wrong database, in which every upload would look orphaned
+            logger.warning('Database has no SVG or PDF files, not collecting upload files')
+            return {}
+
+        referenced = {
+            'fonts': StorageGC._referenced_names(db, FontFile.upload_path),
+            'pdf': StorageGC._referenced_names(db, PDFFile.upload_path),
+            'spool': StorageGC._referenced_names(db, UploadSession.spool_path),
+            # Copies written before blob storage; once a row's content is in a blob its copy is not needed either
+            'svg': StorageGC._referenced_names(db, SVGFile.upload_path, SVGFile.content_hash.is_(None)),
+        }
+
+        report = {}
+        for subdir, names in referenced.items():
+            removed = reclaimed = 0
+            for path, size in StorageGC._old_files(UPLOAD_DIR / subdir, settings.GC_MIN_AGE_HOURS * 3600):
+                name = os.path.basename(path)
+                if name.endswith('.tmp'):
+                    # Left behind by an interrupted gzip sidecar write
+                    orphan = True
+                elif subdir == 'fonts' and name.endswith('.gz'):
+                    # Precompressed sidecars live as long as the font they were made from
+                    orphan = name[:-3] not in names
+                else:
+                    orphan = name not in names
+                if not orphan:
+                    continue
+
+                if not dry_run:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        continue
+                removed += 1
+                reclaimed += size
+            report[subdir] = {'files': removed, 'bytes': reclaimed}
+        return report
+
+    @staticmethod
+    def expire_upload_sessions(db: Session, dry_run: bool = False) -> Dict[str, int]:
+        """Delete upload sessions idle for GC_UPLOAD_RETENTION_HOURS, with the spool files of unfinished ones"""
+        cutoff = datetime.utcnow() - timedelta(hours=settings.GC_UPLOAD_RETENTION_HOURS)
+        expired = reclaimed = 0
+        last_id = ''
+        while True:
+            rows = (
+                db.query(UploadSession.id, UploadSession.spool_path)
+                .filter(UploadSession.updated_at < cutoff, UploadSession.id > last_id)
+                .order_by(UploadSession.id)
+                .limit(settings.GC_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            for upload_id, spool_path in rows:
+                if not dry_run:
+                    # Conditional, a chunk received since the query keeps the session alive
+                    deleted = (
+                        db.query(UploadSession)
+                        .filter(UploadSession.id == upload_id, UploadSession.updated_at < cutoff)
+                        .delete(synchronize_session=False)
+                    )
+                    if not deleted:
+                        continue
+                expired += 1
+                try:
+                    reclaimed += os.path.getsize(spool_path)
+                    if not dry_run:
+                        os.unlink(spool_path)
+                except (FileNotFoundError, TypeError):
+                    pass
+            db.commit()
+        return {'sessions': expired, 'bytes': reclaimed}
+
+    @staticmethod
+    def collect_unreferenced_blobs(db: Session, dry_run: bool = False) -> Dict[str, int]:
+        """Delete SVG blobs no SVG file references. Returns blobs and compressed bytes removed"""
+        cutoff = datetime.utcnow() - timedelta(hours=settings.GC_MIN_AGE_HOURS)
+        unreferenced = ~exists().where(SVGFile.content_hash == SVGBlob.content_hash)
+        removed = reclaimed = 0
+        last_hash = ''
+        while True:
+            rows = (
+                db.query(SVGBlob.content_hash, SVGBlob.compressed_size)
+                .filter(unreferenced, SVGBlob.created_at < cutoff, SVGBlob.content_hash > last_hash)
+                .order_by(SVGBlob.content_hash)
+                .limit(settings.GC_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            last_hash = rows[-1].content_hash
+
+            if not dry_run:
+                hashes = [row.content_hash for row in rows]
+                # Both checks are repeated inside the DELETE, a blob an upload reused since the query stays
+                db.query(SVGBlob).filter(
+                    SVGBlob.content_hash.in_(hashes), unreferenced, SVGBlob.created_at < cutoff
+                ).delete(synchronize_session=False)
+                kept = {h for (h,) in db.query(SVGBlob.content_hash).filter(SVGBlob.content_hash.in_(hashes))}
+                db.commit()
+                rows = [row for row in rows if row.content_hash not in kept]
+            removed += len(rows)
+            reclaimed += sum(row.compressed_size or 0 for row in rows)
+        return {'blobs': removed, 'bytes': reclaimed}
+
+    @staticmethod
+    def compact_database(dry_run: bool = False, full: bool = False) -> Dict[str, Any]:
+        """Return free pages to the filesystem and refresh planner statistics.
+
+        Databases in incremental auto-vacuum mode are shrunk in short steps that interleave with ingestion. Older
+        databases need one full VACUUM (`full`), which rewrites the file, blocks writers while it runs and switches
+        them to incremental mode.
+        """
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+
+            def pragma(name: str) -> int:
+                return conn.execute(text(f'PRAGMA {name}')).scalar()
+
+            page_size = pragma('page_size')
+            pages_before = pragma('page_count')
+            free_pages = pragma('freelist_count')
+            incremental = pragma('auto_vacuum') == 2
+            if dry_run:
+                return {
+                    'incremental': incremental,
+                    'bytes_before': pages_before * page_size,
+                    'bytes_after': (pages_before - free_pages) * page_size,
+                    'bytes': free_pages * page_size,
+                }
+
+            # Run through the driver: executed as a plain statement, the pragma frees a single page
+            driver_connection = conn.connection.driver_connection
+            if full:
+                driver_connection.executescript('PRAGMA auto_vacuum = INCREMENTAL; VACUUM;')
+            elif incremental:
+                while free_pages:
+                    driver_connection.executescript(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});')
+                    remaining = pragma('freelist_count')
+                    if remaining >= free_pages:
+                        break
+                    free_pages = remaining
+            elif free_pages:
+                logger.info(
+                    f'{free_pages} free pages kept, run `cli.py gc --vacuum-full` once to enable incremental vacuum'
+                )
+
+            conn.execute(text(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}'))
+            conn.execute(text('ANALYZE'))
+            pages_after = pragma('page_count')
+            return {
+                'incremental': full or incremental,
+                'bytes_before': pages_before * page_size,
+                'bytes_after': pages_after * page_size,
+                'bytes': max(0, pages_before - pages_after) * page_size,
+            }
+
+    @staticmethod
+    def run(db: Session, dry_run: bool = False, vacuum_full: bool = False) -> Dict[str, Any]:
+        """Run every collection step and compact the database. With `dry_run` only reports what would be reclaimed"""
+        with span('storage_gc'):
+            report: Dict[str, Any] = {}
+            if not dry_run:
+                # Inline content of old rows moves into blobs first, so their svg copies can be collected below
+                moved, _ = svg_storage.compact(db, settings.GC_BATCH_SIZE)
+                report['compacted_svg_files'] = moved
+            report['upload_sessions'] = StorageGC.expire_upload_sessions(db, dry_run)
+            report['files'] = StorageGC.collect_orphan_files(db, dry_run)
+            report['blobs'] = StorageGC.collect_unreferenced_blobs(db, dry_run)
+            report['database'] = StorageGC.compact_database(dry_run, vacuum_full)
+
+        # Rows deleted inside the database are counted by the database shrinking, not again on their own
+        file_bytes = report['upload_sessions']['bytes'] + sum(entry['bytes'] for entry in report['files'].values())
+        if dry_run:
+            database_bytes = report['database']['bytes'] + report['blobs']['bytes']
+        else:
+            database_bytes = report['database']['bytes']
+            gc_reclaimed_bytes.inc(file_bytes, kind='files')
+            gc_reclaimed_bytes.inc(database_bytes, kind='database')
+        report['reclaimed_bytes'] = file_bytes + database_bytes
+
+        logger.info(
+            f'Storage GC: {report["reclaimed_bytes"]} bytes {"reclaimable" if dry_run else "reclaimed"}, '
+            f'{report["blobs"]["blobs"]} blobs, {report["upload_sessions"]["sessions"]} upload sessions, '
+            f'{sum(entry["files"] for entry in report["files"].values())} files'
+        )
+        return report
+
+    @staticmethod
+    def run_in_background() -> Dict[str, Any]:
+        """Scheduler entry point, with its own session"""
+        db = SessionLocal()
+        try:
+            return StorageGC.run(db)
+        finally:
+            db.close()
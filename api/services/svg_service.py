@@ -1,28 +1,55 @@
 import re
 import os
+import html
 import uuid
+import logging
 import zipfile
 import tempfile
-import shutil
+import json
+import time
+import base64
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
-from fastapi import Request
+from xml.sax.saxutils import escape as xml_escape
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert, tuple_
 from sqlalchemy.orm import Session
+from config import settings
 from database.database import SessionLocal
-from database.models import SVGFile, FontFile
+from metrics import errors, span
+from database.models import SVGFile, FontFile, Glyph, GlyphOccurrence
 from services.font_service import FontService
+from services.search_service import SearchService
+from services.svg_storage import svg_storage
+from services.scheduler import PRIORITY_BULK, PRIORITY_DEFAULT, QueueFullError, scheduler
 
-# Upload directory setup
-UPLOAD_DIR = Path('uploads')
-UPLOAD_DIR.mkdir(exist_ok=True)
-(UPLOAD_DIR / 'svg').mkdir(exist_ok=True)
+if TYPE_CHECKING:
+    from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+STYLE_PATTERN = re.compile(r'<style[^>]*>(.*?)</style>', re.DOTALL | re.IGNORECASE)
+CSS_RULE_PATTERN = re.compile(r'\.([\w-]+)\s*\{([^}]+)\}')
+CSS_FONT_FAMILY_PATTERN = re.compile(r'font-family:\s*([^;]+);')
+TEXT_ELEMENT_PATTERN = re.compile(r'(<text\b[^>]*>)(.*?)(</text>)', re.DOTALL | re.IGNORECASE)
+CLASS_ATTR_PATTERN = re.compile(r'\bclass=["\']([^"\']*)["\']')
+FONT_FAMILY_ATTR_PATTERN = re.compile(r'\bfont-family=["\']([^"\']*)["\']')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+# Either a tag (left untouched) or a run of character data
+MARKUP_OR_TEXT_PATTERN = re.compile(r'(<[^>]*>)|([^<]+)')
 
 # Global progress storage (in production, use Redis or similar)
 upload_progress: Dict[str, Dict[str, Any]] = {}
 
-# Thread pool for background tasks
-thread_pool = ThreadPoolExecutor(max_workers=4)
+# SVG ids waiting for their search index entry to be refreshed, drained by one background task at a time
+_search_reindex: Dict[str, Any] = {'pending': set(), 'running': False}
+_search_reindex_lock = threading.Lock()
+
+# (filename filter, status filter) -> (expiry, total) for the /svgs listing
+_svg_count_cache: Dict[Tuple[Optional[str], Optional[str]], Tuple[float, int]] = {}
+_svg_count_cache_lock = threading.Lock()
 
 
 class SVGService:
@@ -45,7 +72,178 @@ class SVGService:
         return unique_fonts
 
     @staticmethod
-    def fix_font_urls_in_svg(svg_content: str, svg_file_id: int, db: Session, request: Request) -> str:
+    def extract_class_fonts(svg_content: str) -> Dict[str, str]:
+        """Map CSS class names declared in <style> blocks to their font-family"""
+        class_fonts = {}
+        for style in STYLE_PATTERN.findall(svg_content):
+            for class_name, body in CSS_RULE_PATTERN.findall(style):
+                font_match = CSS_FONT_FAMILY_PATTERN.search(body)
+                if font_match:
+                    class_fonts[class_name.strip()] = font_match.group(1).strip().strip('"\'')
+        return class_fonts
+
+    @staticmethod
+    def _text_element_family(open_tag: str, class_fonts: Dict[str, str]) -> Optional[str]:
+        class_match = CLASS_ATTR_PATTERN.search(open_tag)
+        if class_match and class_match.group(1).strip() in class_fonts:
+            return class_fonts[class_match.group(1).strip()]
+
+        family_match = FONT_FAMILY_ATTR_PATTERN.search(open_tag)
+        if family_match:
+            return family_match.group(1).split(',')[0].strip().strip('"\'')
+        return None
+
+    @staticmethod
+    def iter_text_runs(svg_content: str) -> Iterator[Tuple[Optional[str], str]]:
+        """Yield (font family, text) for every <text> element, with markup stripped and entities resolved"""
+        class_fonts = SVGService.extract_class_fonts(svg_content)
+        for open_tag, inner, _ in TEXT_ELEMENT_PATTERN.findall(svg_content):
+            family = SVGService._text_element_family(open_tag, class_fonts)
+            yield family, html.unescape(TAG_PATTERN.sub('', inner))
+
+    @staticmethod
+    def match_font_for_family(family: str, fonts: List[Tuple[str, str]]) -> Optional[int]:
+        """Index of the (font_name, filename) pair used for a CSS font-family, same rules as the live preview"""
+        for i, (font_name, filename) in enumerate(fonts):
+            if font_name == family or family in (filename or '') or (font_name and font_name in family):
+                return i
+        return None
+
+    @staticmethod
+    def decode_svg(svg_content: str, tables_by_family: Dict[str, Dict[int, str]]) -> str:
+        """Apply per-font translation tables to the character data of every <text> element"""
+        class_fonts = SVGService.extract_class_fonts(svg_content)
+
+        def decode_element(match):
+            open_tag, inner, close_tag = match.groups()
+            table = tables_by_family.get(SVGService._text_element_family(open_tag, class_fonts))
+            if not table:
+                return match.group(0)
+
+            def decode_text(part):
+                if part.group(1):
+                    return part.group(1)
+                return xml_escape(html.unescape(part.group(2)).translate(table))
+
+            return open_tag + MARKUP_OR_TEXT_PATTERN.sub(decode_text, inner) + close_tag
+
+        return TEXT_ELEMENT_PATTERN.sub(decode_element, svg_content)
+
+    @staticmethod
+    def translation_tables(db: Session, svg_file: SVGFile) -> Dict[str, Dict[int, str]]:
+        """Translation table of every font family used by the SVG's text"""
+        fonts = db.query(FontFile).filter(FontFile.svg_file_id == svg_file.id).all()
+        font_keys = [(font.font_name, font.filename) for font in fonts]
+
+        tables_by_family = {}
+        for family, _ in SVGService.iter_text_runs(svg_storage.load(db, svg_file)):
+            if family is None or family in tables_by_family:
+                continue
+            index = SVGService.match_font_for_family(family, font_keys)
+            tables_by_family[family] = (
+                FontService.get_translation_table(db, fonts[index].id) if index is not None else {}
+            )
+        return tables_by_family
+
+    @staticmethod
+    def decode_svg_file(db: Session, svg_file: SVGFile) -> str:
+        """Decode an SVG using the current glyph mappings of its fonts"""
+        return SVGService.decode_svg(svg_storage.load(db, svg_file), SVGService.translation_tables(db, svg_file))
+
+    @staticmethod
+    def decoded_text(db: Session, svg_file: SVGFile) -> str:
+        """Plain decoded text of an SVG, one line per <text> element"""
+        tables_by_family = SVGService.translation_tables(db, svg_file)
+        return '\n'.join(
+            text.translate(tables_by_family.get(family) or {})
+            for family, text in SVGService.iter_text_runs(svg_storage.load(db, svg_file))
+        )
+
+    @staticmethod
+    def reindex_decoded_text(db: Session, svg_file_ids: List[int]):
+        """Refresh the full-text search entries of SVGs from their current mappings"""
+        if not svg_file_ids or not SearchService.is_available(db):
+            return
+        svg_files = db.query(SVGFile).filter(SVGFile.id.in_(svg_file_ids)).all()
+        documents = [(svg_file.id, SVGService.decoded_text(db, svg_file)) for svg_file in svg_files]
+        SearchService.upsert_documents(db, documents)
+
+    @staticmethod
+    def _drain_search_reindex():
+        db = SessionLocal()
+        try:
+            while True:
+                with _search_reindex_lock:
+                    svg_file_ids = sorted(_search_reindex['pending'])
+                    _search_reindex['pending'].clear()
+                    if not svg_file_ids:
+                        _search_reindex['running'] = False
+                        return
+                try:
+                    SVGService.reindex_decoded_text(db, svg_file_ids)
+                except Exception as e:
+                    db.rollback()
+                    errors.inc(component='search_index')
+                    logger.warning(f'Could not refresh search index for SVGs {svg_file_ids}: {e}')
+        finally:
+            db.close()
+
+    @staticmethod
+    def schedule_reindex(svg_file_ids: List[int]):
+        """Refresh search entries in the background; repeated edits of one SVG coalesce into one refresh"""
+        with _search_reindex_lock:
+            _search_reindex['pending'].update(svg_file_id for svg_file_id in svg_file_ids if svg_file_id)
+            if _search_reindex['running'] or not _search_reindex['pending']:
+                return
+            _search_reindex['running'] = True
+        scheduler.submit(SVGService._drain_search_reindex, priority=PRIORITY_DEFAULT)
+
+    @staticmethod
+    def index_glyph_occurrences(db: Session, svg_file_id: int, font_ids: Optional[List[int]] = None) -> int:
+        """Recount how often each glyph of the SVG's fonts (or just `font_ids`) appears in it. Returns rows written"""
+        svg_file = db.query(SVGFile).filter(SVGFile.id == svg_file_id).first()
+        if not svg_file:
+            return 0
+
+        fonts = db.query(FontFile).filter(FontFile.svg_file_id == svg_file_id).order_by(FontFile.id).all()
+        font_keys = [(font.font_name, font.filename) for font in fonts]
+        target_ids = set(font_ids) if font_ids is not None else {font.id for font in fonts}
+
+        counts: Dict[int, Counter] = {font_id: Counter() for font_id in target_ids}
+        font_by_family: Dict[Optional[str], Optional[int]] = {}
+        for family, text in SVGService.iter_text_runs(svg_storage.load(db, svg_file)):
+            if family not in font_by_family:
+                index = SVGService.match_font_for_family(family, font_keys) if family else None
+                font_by_family[family] = fonts[index].id if index is not None else None
+            font_id = font_by_family[family]
+            if font_id in counts:
+                counts[font_id].update(text)
+
+        with span('occurrence_index'):
+            glyph_ids = [row.id for row in db.query(Glyph.id).filter(Glyph.font_file_id.in_(target_ids))]
+            if glyph_ids:
+                db.query(GlyphOccurrence).filter(
+                    GlyphOccurrence.svg_file_id == svg_file_id, GlyphOccurrence.glyph_id.in_(glyph_ids)
+                ).delete(synchronize_session=False)
+
+            rows = []
+            for glyph_id, font_file_id, codepoint in db.query(Glyph.id, Glyph.font_file_id, Glyph.codepoint).filter(
+                Glyph.font_file_id.in_(target_ids), Glyph.is_retired == False, Glyph.codepoint.startswith('U+')
+            ):
+                try:
+                    count = counts[font_file_id].get(chr(int(codepoint[2:], 16)), 0)
+                except ValueError:
+                    continue
+                if count:
+                    rows.append({'glyph_id': glyph_id, 'svg_file_id': svg_file_id, 'count': count})
+
+            if rows:
+                db.execute(insert(GlyphOccurrence), rows)
+            db.commit()
+        return len(rows)
+
+    @staticmethod
+    def fix_font_urls_in_svg(svg_content: str, svg_file_id: int, db: Session, request: 'Request') -> str:
         """Replace font URLs in SVG with absolute URLs to backend endpoints"""
         base_url = str(request.base_url).rstrip('/')
 
@@ -77,25 +275,20 @@ class SVGService:
     @staticmethod
     def save_svg_file(file_content: bytes, filename: str, db: Session) -> Dict[str, Any]:
         """Save uploaded SVG file and extract font references"""
-        file_id = str(uuid.uuid4())
-        file_path = UPLOAD_DIR / 'svg' / f'{file_id}_{filename}'
-
-        # Save file to disk
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-
         # Decode content and extract font references
         svg_content = file_content.decode('utf-8')
         font_references = SVGService.extract_font_references(svg_content)
 
-        # Store SVG in database
+        # Store SVG in database, identical documents share one compressed blob
         db_svg = SVGFile(
             filename=filename,
-            content=svg_content,
-            upload_path=str(file_path),
+            content_hash=svg_storage.store(db, svg_content),
+            size=len(file_content),
         )
         db.add(db_svg)
         db.commit()
+        SVGService.invalidate_svg_counts()
+        SVGService.reindex_decoded_text(db, [db_svg.id])
 
         return {'file_id': db_svg.id, 'filename': filename, 'required_fonts': font_references}
 
@@ -110,6 +303,106 @@ class SVGService:
             'completed': current >= total,
         }
 
+    @staticmethod
+    def encode_cursor(created_at: datetime, svg_file_id: int) -> str:
+        raw = json.dumps([created_at.isoformat(), svg_file_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Inverse of encode_cursor, raises ValueError for anything malformed"""
+        try:
+            created_at, svg_file_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return datetime.fromisoformat(created_at), int(svg_file_id)
+        except (TypeError, ValueError, json.JSONDecodeError) as e:
+            raise ValueError(f'Invalid cursor: {cursor}') from e
+
+    @staticmethod
+    def _svg_list_query(db: Session, filename: Optional[str], status: Optional[str]):
+        query = db.query(SVGFile.id, SVGFile.filename, SVGFile.created_at)
+        if filename:
+            query = query.filter(SVGFile.filename.ilike(f'%{filename}%'))
+
+        if status:
+            # Probed per listed SVG through the font and glyph progress indexes, and stopping at the first match,
+            # instead of aggregating every glyph before the page can be cut
+            def has_glyphs(*criteria):
+                return (
+                    db.query(Glyph.id)
+                    .join(FontFile, FontFile.id == Glyph.font_file_id)
+                    .filter(FontFile.svg_file_id == SVGFile.id, Glyph.is_retired == False, *criteria)
+                    .exists()
+                )
+
+            has_mapped = has_glyphs(Glyph.is_mapped == True)
+            has_unmapped = has_glyphs(Glyph.is_mapped.isnot(True))
+            if status == 'unmapped':
+                query = query.filter(~has_mapped)
+            elif status == 'partial':
+                query = query.filter(has_mapped, has_unmapped)
+            else:
+                query = query.filter(has_mapped, ~has_unmapped)
+        return query
+
+    @staticmethod
+    def list_svgs(
+        db: Session,
+        limit: int,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        filename: Optional[str] = None,
+        status: Optional[str] = None,
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Newest-first page of (id, filename, created_at) rows and the cursor of the next page.
+
+        With a cursor the page is found by seeking the (created_at, id) index, so deep pages cost the same as the
+        first one; `offset` is kept for page-number clients.
+        """
+        query = SVGService._svg_list_query(db, filename, status)
+        if cursor:
+            created_at, svg_file_id = SVGService.decode_cursor(cursor)
+            query = query.filter(tuple_(SVGFile.created_at, SVGFile.id) < tuple_(created_at, svg_file_id))
+
+        query = query.order_by(SVGFile.created_at.desc(), SVGFile.id.desc())
+        if offset and not cursor:
+            query = query.offset(offset)
+        rows = query.limit(limit + 1).all()
+        next_cursor = (
+            SVGService.encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        )
+        return rows[:limit], next_cursor
+
+    @staticmethod
+    def count_svgs(db: Session, filename: Optional[str] = None, status: Optional[str] = None) -> int:
+        """Listing total, cached for SVG_COUNT_CACHE_SECONDS and dropped whenever SVGs are added"""
+        key = (filename or None, status or None)
+        now = time.monotonic()
+        with _svg_count_cache_lock:
+            cached = _svg_count_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        total = SVGService._svg_list_query(db, filename, status).order_by(None).count()
+        with _svg_count_cache_lock:
+            _svg_count_cache[key] = (now + settings.SVG_COUNT_CACHE_SECONDS, total)
+        return total
+
+    @staticmethod
+    def invalidate_svg_counts():
+        with _svg_count_cache_lock:
+            _svg_count_cache.clear()
+
+    @staticmethod
+    def mark_cancelled(task_id: str):
+        upload_progress[task_id] = {
+            'current': 100,
+            'total': 100,
+            'percentage': 100,
+            'message': 'Cancelled',
+            'completed': True,
+            'cancelled': True,
+        }
+
     @staticmethod
     def get_progress(task_id: str) -> Dict[str, Any]:
         """Get progress for a task"""
@@ -117,9 +410,100 @@ class SVGService:
             task_id, {'current': 0, 'total': 0, 'percentage': 0, 'message': 'Task not found', 'completed': False}
         )
 
+    @staticmethod
+    def scan_directory(root: Path) -> Tuple[List[Path], List[Path], List[Path]]:
+        """Find SVG and font files under `root`. Returns (all SVGs, valid SVGs, valid fonts)"""
+
+        # Filter out system/metadata files
+        def is_valid_file(file_path):
+            """Check if file is not a system/metadata file"""
+            filename = file_path.name
+            if filename.startswith('._') or filename.startswith('.') or '__MACOSX' in str(file_path):
+                return False
+            return True
+
+        all_svg_files = list(root.rglob('*.svg'))
+        svg_files = [f for f in all_svg_files if is_valid_file(f) and f.name.lower().endswith('.svg')]
+
+        all_font_files = (
+            list(root.rglob('*.woff'))
+            + list(root.rglob('*.woff2'))
+            + list(root.rglob('*.ttf'))
+            + list(root.rglob('*.otf'))
+        )
+        font_files = [f for f in all_font_files if is_valid_file(f)]
+
+        return all_svg_files, svg_files, font_files
+
+    @staticmethod
+    def ingest_svg_path(db: Session, svg_file: Path, font_files: List[Path]) -> Optional[Dict[str, Any]]:
+        """Store an SVG from disk along with its matching fonts. Returns None if the file is not a usable SVG"""
+        # Read SVG content with encoding handling
+        try:
+            svg_content = svg_file.read_text(encoding='utf-8')
+        except UnicodeDecodeError:
+            try:
+                svg_content = svg_file.read_text(encoding='latin-1')
+            except UnicodeDecodeError:
+                logger.warning(f"Cannot decode SVG file '{svg_file.name}' - skipping")
+                return None
+
+        # Basic validation
+        if not ('<svg' in svg_content.lower() or 'xml' in svg_content.lower()):
+            logger.warning(f"File '{svg_file.name}' doesn't appear to be a valid SVG - skipping")
+            return None
+
+        # Extract required fonts
+        required_fonts = SVGService.extract_font_references(svg_content)
+
+        # Store SVG in database, identical documents share one compressed blob
+        db_svg = SVGFile(
+            filename=svg_file.name,
+            content_hash=svg_storage.store(db, svg_content),
+            size=svg_file.stat().st_size,
+        )
+        db.add(db_svg)
+        with span('db_commit'):
+            db.commit()
+        SVGService.invalidate_svg_counts()
+
+        # Match and process fonts
+        matched_fonts = FontService.match_fonts_to_svg(required_fonts, font_files)
+
+        processed_fonts = []
+        for font_file in matched_fonts:
+            try:
+                font_result = FontService.process_font_from_zip(font_file, db_svg.id, db)
+                processed_fonts.append(font_result)
+            except Exception as e:
+                errors.inc(component='zip_font')
+                logger.warning(f"Error processing font '{font_file.name}': {e}")
+                continue
+
+        if processed_fonts:
+            SVGService.index_glyph_occurrences(db, db_svg.id)
+        SVGService.reindex_decoded_text(db, [db_svg.id])
+
+        return {
+            'svg_file_id': db_svg.id,
+            'filename': svg_file.name,
+            'required_fonts': required_fonts,
+            'matched_fonts': [font['font_name'] for font in processed_fonts],
+            'matched_font_files': [font_file.name for font_file in matched_fonts],
+        }
+
     @staticmethod
     def process_zip_in_background(task_id: str, zip_content: bytes, filename: str):
-        """Process ZIP file in background thread"""
+        """Process ZIP content held in memory, see process_zip_path"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = Path(temp_dir) / 'upload.zip'
+            SVGService.update_progress(task_id, 1, 100, 'Saving ZIP file...')
+            zip_path.write_bytes(zip_content)
+            SVGService.process_zip_path(task_id, zip_path, filename)
+
+    @staticmethod
+    def process_zip_path(task_id: str, zip_path: Path, filename: str, remove_source: bool = False):
+        """Process a ZIP file on disk in a background thread. `remove_source` deletes it afterwards (spooled uploads)"""
         try:
             # Create a new database session for the background thread
             db = SessionLocal()
@@ -128,49 +512,20 @@ class SVGService:
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_path = Path(temp_dir)
 
-                # Save uploaded ZIP file
-                zip_path = temp_path / 'upload.zip'
-                SVGService.update_progress(task_id, 1, 100, 'Saving ZIP file...')
-
-                with open(zip_path, 'wb') as f:
-                    f.write(zip_content)
-
                 # Extract ZIP file
                 SVGService.update_progress(task_id, 5, 100, 'Extracting ZIP file...')
                 try:
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                    with span('zip_extract'), zipfile.ZipFile(zip_path, 'r') as zip_ref:
                         zip_ref.extractall(temp_path)
                 except zipfile.BadZipFile:
+                    errors.inc(component='zip_extract')
                     SVGService.update_progress(task_id, 100, 100, 'Error: Invalid ZIP file')
                     return
 
                 SVGService.update_progress(task_id, 10, 100, 'Scanning for files...')
 
-                # Find all SVG and font files, filtering out system/metadata files
-                def is_valid_svg_file(file_path):
-                    """Check if file is a valid SVG (not a system/metadata file)"""
-                    filename = file_path.name
-                    if filename.startswith('._') or filename.startswith('.') or '__MACOSX' in str(file_path):
-                        return False
-                    return filename.lower().endswith('.svg')
-
-                def is_valid_font_file(file_path):
-                    """Check if file is a valid font file (not a system/metadata file)"""
-                    filename = file_path.name
-                    if filename.startswith('._') or filename.startswith('.') or '__MACOSX' in str(file_path):
-                        return False
-                    return True
-
-                all_svg_files = list(temp_path.rglob('*.svg'))
-                svg_files = [f for f in all_svg_files if is_valid_svg_file(f)]
-
-                all_font_files = (
-                    list(temp_path.rglob('*.woff'))
-                    + list(temp_path.rglob('*.woff2'))
-                    + list(temp_path.rglob('*.ttf'))
-                    + list(temp_path.rglob('*.otf'))
-                )
-                font_files = [f for f in all_font_files if is_valid_font_file(f)]
+                with span('zip_scan'):
+                    all_svg_files, svg_files, font_files = SVGService.scan_directory(temp_path)
 
                 if not svg_files:
                     skipped_count = len(all_svg_files) - len(svg_files)
@@ -191,78 +546,27 @@ class SVGService:
 
                 # Process each SVG file
                 for i, svg_file in enumerate(svg_files):
+                    if scheduler.is_cancelled(task_id):
+                        logger.info(f'ZIP task {task_id} cancelled after {len(processed_svgs)} SVG files')
+                        SVGService.mark_cancelled(task_id)
+                        return
+
                     svg_progress = int(15 + (85 * i / len(svg_files)))
                     SVGService.update_progress(
                         task_id, svg_progress, 100, f'Processing SVG {i + 1}/{len(svg_files)}: {svg_file.name}'
                     )
 
                     try:
-                        # Read SVG content with encoding handling
-                        try:
-                            svg_content = svg_file.read_text(encoding='utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                svg_content = svg_file.read_text(encoding='latin-1')
-                            except UnicodeDecodeError:
-                                print(f"Error: Cannot decode SVG file '{svg_file.name}' - skipping")
-                                continue
-
-                        # Basic validation
-                        if not ('<svg' in svg_content.lower() or 'xml' in svg_content.lower()):
-                            print(f"Warning: File '{svg_file.name}' doesn't appear to be a valid SVG - skipping")
-                            continue
-
-                        # Extract required fonts
-                        required_fonts = SVGService.extract_font_references(svg_content)
-
-                        # Create unique file path for this SVG
-                        file_id = str(uuid.uuid4())
-                        final_svg_path = UPLOAD_DIR / 'svg' / f'{file_id}_{svg_file.name}'
-
-                        # Copy SVG to final location
-                        shutil.copy(svg_file, final_svg_path)
-
-                        # Store SVG in database
-                        db_svg = SVGFile(
-                            filename=svg_file.name,
-                            content=svg_content,
-                            upload_path=str(final_svg_path),
-                        )
-                        db.add(db_svg)
-                        db.commit()
-
-                        # Match and process fonts
-                        matched_fonts = FontService.match_fonts_to_svg(required_fonts, font_files)
-
-                        # Track matched fonts
-                        for font_file in matched_fonts:
-                            all_matched_fonts.add(font_file.name)
-
-                        processed_fonts = []
-                        for font_file in matched_fonts:
-                            try:
-                                font_result = FontService.process_font_from_zip(font_file, db_svg.id, db)
-                                processed_fonts.append(font_result)
-                            except Exception as e:
-                                print(f"Error processing font '{font_file.name}': {e}")
-                                continue
-
-                        # Get list of matched font names
-                        matched_font_names = [font['font_name'] for font in processed_fonts]
-
-                        processed_svgs.append(
-                            {
-                                'svg_file_id': db_svg.id,
-                                'filename': svg_file.name,
-                                'required_fonts': required_fonts,
-                                'matched_fonts': matched_font_names,
-                            }
-                        )
-
+                        result = SVGService.ingest_svg_path(db, svg_file, font_files)
                     except Exception as e:
-                        print(f"Error processing SVG '{svg_file.name}': {e}")
+                        errors.inc(component='zip_svg')
+                        logger.warning(f"Error processing SVG '{svg_file.name}': {e}")
                         continue
 
+                    if result:
+                        all_matched_fonts.update(result.pop('matched_font_files'))
+                        processed_svgs.append(result)
+
                 # Find unmatched fonts
                 unmatched_fonts = [f.name for f in font_files if f.name not in all_matched_fonts]
 
@@ -277,10 +581,8 @@ class SVGService:
                 }
 
         except Exception as e:
-            print(f'Error in background processing: {e}')
-            import traceback
-
-            traceback.print_exc()
+            errors.inc(component='zip')
+            logger.exception('Error in background processing')
             upload_progress[task_id] = {
                 'current': 100,
                 'total': 100,
@@ -291,11 +593,32 @@ class SVGService:
             }
         finally:
             db.close()
+            if remove_source:
+                Path(zip_path).unlink(missing_ok=True)
 
     @staticmethod
-    def start_zip_processing(zip_content: bytes, filename: str) -> str:
-        """Start background ZIP processing and return task ID"""
+    def start_zip_processing(zip_path: Path, filename: str, client: Optional[str] = None) -> str:
+        """Queue background processing of a spooled ZIP, which is deleted once processed. Returns the task ID.
+
+        Raises QueueFullError when the queue is full; the file is kept so the caller can retry or remove it.
+        """
         task_id = str(uuid.uuid4())
-        SVGService.update_progress(task_id, 0, 100, 'Starting processing...')
-        thread_pool.submit(SVGService.process_zip_in_background, task_id, zip_content, filename)
+
+        def cancelled_while_queued():
+            SVGService.mark_cancelled(task_id)
+            Path(zip_path).unlink(missing_ok=True)
+
+        SVGService.update_progress(task_id, 0, 100, 'Waiting in queue...')
+        try:
+            scheduler.submit(
+                SVGService.process_zip_path,
+                (task_id, zip_path, filename, True),
+                task_id=task_id,
+                priority=PRIORITY_BULK,
+                client=client,
+                on_cancel=cancelled_while_queued,
+            )
+        except QueueFullError:
+            upload_progress.pop(task_id, None)
+            raise
         return task_id
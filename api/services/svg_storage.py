@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import record_cache, span
+from database.models import SVGBlob, SVGFile
+
+logger = logging.getLogger(__name__)
+
+
+class SVGStorage:
+    """Content-addressed store of SVG documents: one gzip blob per distinct content, shared by all its SVGFile rows.
+
+    Documents are decompressed only when their content is read, and the most recently read ones are kept in memory
+    since decoding, indexing and search refreshes usually read the same SVG several times in a row.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _remember(self, content_hash: str, content: str):
+        with self._lock:
+            self._cache[content_hash] = content
+            self._cache.move_to_end(content_hash)
+            while len(self._cache) > settings.SVG_CONTENT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _cached(self, content_hash: str):
+        with self._lock:
+            content = self._cache.get(content_hash)
+            if content is not None:
+                self._cache.move_to_end(content_hash)
+        record_cache('svg_content', content is not None)
+        return content
+
+    def store(self, db: Session, content: str) -> str:
+        """Add a document unless identical content is already stored. Returns its hash; the caller commits"""
+        content_hash = self.content_hash(content)
+        # Reusing a blob renews it, so storage GC leaves it alone until the caller's SVGFile row is committed. The
+        # write also takes the database write lock, which a GC delete of the same blob then waits for
+        reused = (
+            db.query(SVGBlob)
+            .filter(SVGBlob.content_hash == content_hash)
+            .update({'created_at': datetime.utcnow()}, synchronize_session=False)
+        )
+        if not reused:
+            raw = content.encode('utf-8')
+            with span('svg_compress'):
+                data = gzip.compress(raw, compresslevel=6, mtime=0)
+            # Another ingestion thread may store the same document between the check and the insert
+            db.execute(
+                sqlite_insert(SVGBlob)
+                .values(
+                    content_hash=content_hash,
+                    encoding='gzip',
+                    data=data,
+                    size=len(raw),
+                    compressed_size=len(data),
+                )
+                .on_conflict_do_nothing(index_elements=['content_hash'])
+            )
+        self._remember(content_hash, content)
+        return content_hash
+
+    @staticmethod
+    def _decompress(encoding: str, data: bytes) -> str:
+        if encoding != 'gzip':
+            raise ValueError(f'Unknown SVG blob encoding: {encoding}')
+        with span('svg_decompress'):
+            return gzip.decompress(data).decode('utf-8')
+
+    def load(self, db: Session, svg_file: SVGFile) -> str:
+        """Content of an SVG file, whether stored as a blob or inline by an older version"""
+        if not svg_file.content_hash:
+            return svg_file.content or ''
+
+        content = self._cached(svg_file.content_hash)
+        if content is None:
+            blob = (
+                db.query(SVGBlob.encoding, SVGBlob.data).filter(SVGBlob.content_hash == svg_file.content_hash).first()
+            )
+            if blob is None:
+                logger.warning(f'Missing content blob {svg_file.content_hash} of SVG {svg_file.id}')
+                return ''
+            content = self._decompress(blob.encoding, blob.data)
+            self._remember(svg_file.content_hash, content)
+        return content
+
+    def iter_contents(self, db: Session, svg_file_ids: List[int]) -> Iterator[Tuple[int, str]]:
+        """(svg_file_id, content) for a batch of SVGs, reading each missing blob once"""
+        rows = db.query(SVGFile.id, SVGFile.content_hash).filter(SVGFile.id.in_(svg_file_ids)).all()
+
+        contents: Dict[str, str] = {}
+        missing = set()
+        for _, content_hash in rows:
+            if content_hash and content_hash not in contents:
+                content = self._cached(content_hash)
+                if content is None:
+                    missing.add(content_hash)
+                else:
+                    contents[content_hash] = content
+        if missing:
+            for content_hash, encoding, data in db.query(SVGBlob.content_hash, SVGBlob.encoding, SVGBlob.data).filter(
+                SVGBlob.content_hash.in_(missing)
+            ):
+                contents[content_hash] = self._decompress(encoding, data)
+
+        legacy_ids = [svg_file_id for svg_file_id, content_hash in rows if not content_hash]
+        legacy = dict(db.query(SVGFile.id, SVGFile.content).filter(SVGFile.id.in_(legacy_ids))) if legacy_ids else {}
+
+        for svg_file_id, content_hash in rows:
+            yield svg_file_id, contents.get(content_hash, '') if content_hash else legacy.get(svg_file_id) or ''
+
+    def compact(self, db: Session, batch_size: int = 200) -> Tuple[int, int]:
+        """Move inline content of rows stored before blobs into the blob store. Returns (rows moved, inline bytes)"""
+        moved = inline_bytes = 0
+        while True:
+            rows = (
+                db.query(SVGFile.id, SVGFile.content)
+                .filter(SVGFile.content_hash.is_(None), SVGFile.content.isnot(None))
+                .order_by(SVGFile.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return moved, inline_bytes
+
+            for svg_file_id, content in rows:
+                size = len(content.encode('utf-8'))
+                db.query(SVGFile).filter(SVGFile.id == svg_file_id).update(
+                    {'content_hash': self.store(db, content), 'size': size, 'content': None},
+                    synchronize_session=False,
+                )
+                inline_bytes += size
+            db.commit()
+            moved += len(rows)
+
+
+svg_storage = SVGStorage()
@@ -0,0 +1,106 @@
+"""Synthetic fonts, SVGs and ZIP archives for the benchmark suite"""
+
+import io
+import random
+import zipfile
+from typing import List, Tuple
+
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+# Ranges that hold printable, non-surrogate codepoints, walked in order until enough are collected
+CODEPOINT_RANGES = [(0x21, 0x7F), (0xA1, 0xD800), (0xE000, 0xFFFE), (0x10000, 0x2FFFF)]
+
+
+def synthetic_codepoints(count: int) -> List[int]:
+    codepoints = []
+    for start, stop in CODEPOINT_RANGES:
+        for codepoint in range(start, stop):
+            codepoints.append(codepoint)
+            if len(codepoints) == count:
+                return codepoints
+    raise ValueError(f'Cannot generate {count} codepoints')
+
+
+def _draw_glyph(index: int):
+    """A small polygon whose shape depends on the glyph index, so every outline is distinct"""
+    pen = TTGlyphPen(None)
+    width = 100 + (index * 37) % 700
+    height = 100 + (index * 53) % 600
+    notch = 10 + index % 90
+    pen.moveTo((50, 0))
+    pen.lineTo((50, height))
+    pen.lineTo((width, height))
+    pen.lineTo((width, notch))
+    pen.lineTo((width // 2, 0))
+    pen.closePath()
+    return pen.glyph()
+
+
+def build_font(glyph_count: int, family: str = 'SynthFont', flavor: str = None) -> Tuple[bytes, List[int]]:
+    """Build a TrueType font with `glyph_count` cmap-mapped glyphs. Returns (font bytes, codepoints)"""
+    codepoints = synthetic_codepoints(glyph_count)
+    glyph_names = ['.notdef'] + [f'g{i}' for i in range(glyph_count)]
+
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_names)
+    builder.setupCharacterMap({codepoint: f'g{i}' for i, codepoint in enumerate(codepoints)})
+    builder.setupGlyf({name: _draw_glyph(i) for i, name in enumerate(glyph_names)})
+    builder.setupHorizontalMetrics({name: (800, 50) for name in glyph_names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({'familyName': family, 'styleName': 'Regular'})
+    builder.setupOS2()
+    builder.setupPost()
+
+    if flavor:
+        builder.font.flavor = flavor
+
+    buffer = io.BytesIO()
+    builder.save(buffer)
+    return buffer.getvalue(), codepoints
+
+
+def build_svg(fonts: List[Tuple[str, str, List[int]]], lines: int = 40, line_length: int = 80, seed: int = 0) -> str:
+    """Build an SVG in the layout produced by PDF exporters: @font-face rules plus classed <text> runs.
+
+    `fonts` is a list of (family, font filename, codepoints available in that font).
+    """
+    rng = random.Random(seed)
+    rules = []
+    for i, (family, filename, _) in enumerate(fonts):
+        rules.append(f'@font-face {{ font-family: {family}; src: url("fonts/{filename}"); }}')
+        rules.append(f'.f{i} {{ font-family: {family}; }}')
+
+    texts = []
+    for line in range(lines):
+        font_index = line % len(fonts)
+        codepoints = fonts[font_index][2]
+        text = ''.join(chr(rng.choice(codepoints)) for _ in range(line_length))
+        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        texts.append(f'<text class="f{font_index}" x="10" y="{20 + line * 14}">{text}</text>')
+
+    style = '\n'.join(rules)
+    body = '\n'.join(texts)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" width="800" height="1200">\n'
+        f'<style>\n{style}\n</style>\n{body}\n</svg>\n'
+    )
+
+
+def build_zip(svg_count: int, font_count: int, glyph_count: int) -> bytes:
+    """Build a ZIP of `svg_count` SVG pages that each reference all `font_count` fonts"""
+    fonts = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(font_count):
+            family = f'SynthFont{i}'
+            filename = f'{family}.ttf'
+            data, codepoints = build_font(glyph_count, family)
+            archive.writestr(f'export/fonts/{filename}', data)
+            fonts.append((family, filename, codepoints))
+
+        for page in range(svg_count):
+            archive.writestr(f'export/page{page:04d}.svg', build_svg(fonts, seed=page))
+
+    return buffer.getvalue()